@@ -0,0 +1,111 @@
+"""
+Benchmark de la búsqueda de imágenes por FCL: escaneo secuencial vs índice
+
+Crea una tabla temporal con la forma de images_fcl_drive (nombres de carpeta
+con espacios sobrantes y una columna base64 pesada), mide la consulta por FCL
+de la aplicación sin índice y luego con el índice de expresión sobre
+TRIM(folder_name) que crea utils.db_migrations. La tabla es temporal: no
+modifica el esquema real.
+
+Uso:
+    python benchmark_fcl_lookup.py --rows 200000 --fcls 2000 --image-kb 4
+"""
+
+import sys
+import time
+import argparse
+import psycopg2
+from utils.handler_db import DB_CONFIG
+from utils.db_migrations import fcl_filter, fcl_index_sql
+
+BENCH_TABLE = "bench_images_fcl_drive"
+
+
+def create_table(cursor, rows, fcls, image_kb):
+    """Tabla temporal con `rows` imágenes repartidas en `fcls` carpetas"""
+    cursor.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+    cursor.execute(f"""
+        CREATE TEMP TABLE {BENCH_TABLE} (
+            id SERIAL PRIMARY KEY,
+            folder_name TEXT,
+            image_base64 TEXT
+        )
+    """)
+    # Espacios al final como en los nombres reales de Drive; el base64 se
+    # arma con md5 para que no se comprima a casi nada en TOAST
+    cursor.execute(f"""
+        INSERT INTO {BENCH_TABLE} (folder_name, image_base64)
+        SELECT 'FCL-' || (g %% %s) || repeat(' ', g %% 3),
+               repeat(md5(g::text), %s)
+        FROM generate_series(1, %s) AS g
+    """, (fcls, max(1, image_kb * 1024 // 32), rows))
+    cursor.execute(f"ANALYZE {BENCH_TABLE}")
+
+
+def lookup_sql(fcl):
+    where, params = fcl_filter(fcl)
+    return f"SELECT id, image_base64 FROM {BENCH_TABLE} WHERE {where}", params
+
+
+def plan_node(cursor, fcl):
+    """Tipo de nodo del plan de la consulta por FCL"""
+    sql, params = lookup_sql(fcl)
+    cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+    plan = cursor.fetchone()[0][0]['Plan']
+    while plan.get('Plans') and plan['Node Type'] not in ('Seq Scan', 'Index Scan', 'Bitmap Heap Scan'):
+        plan = plan['Plans'][0]
+    return plan['Node Type']
+
+
+def time_lookups(cursor, fcls, repeat):
+    """Milisegundos promedio por consulta, recorriendo FCL distintos"""
+    start = time.perf_counter()
+    images = 0
+    for i in range(repeat):
+        sql, params = lookup_sql(f"FCL-{(i * 7919) % fcls}")
+        cursor.execute(sql, params)
+        images += len(cursor.fetchall())
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    return elapsed_ms / repeat, images / repeat
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Escaneo secuencial vs índice en la búsqueda por FCL")
+    parser.add_argument("--rows", type=int, default=200000, help="Imágenes en la tabla sintética")
+    parser.add_argument("--fcls", type=int, default=2000, help="Carpetas FCL distintas")
+    parser.add_argument("--image-kb", type=int, default=4, help="Tamaño aproximado del base64 por fila")
+    parser.add_argument("--repeat", type=int, default=50, help="Consultas por medición")
+    args = parser.parse_args(argv)
+
+    try:
+        connection = psycopg2.connect(**DB_CONFIG)
+    except psycopg2.Error as e:
+        print(f"❌ No se pudo conectar con la base de datos: {e}")
+        return 1
+
+    try:
+        with connection.cursor() as cursor:
+            print(f"🧪 Creando tabla sintética: {args.rows} filas, {args.fcls} FCL, ~{args.image_kb} KB por imagen")
+            create_table(cursor, args.rows, args.fcls, args.image_kb)
+
+            results = []
+            scan_node = plan_node(cursor, "FCL-1")
+            results.append(("Sin índice", scan_node, *time_lookups(cursor, args.fcls, args.repeat)))
+
+            cursor.execute(fcl_index_sql(BENCH_TABLE, f"idx_{BENCH_TABLE}_fcl", concurrently=False))
+            cursor.execute(f"ANALYZE {BENCH_TABLE}")
+            index_node = plan_node(cursor, "FCL-1")
+            results.append(("Índice TRIM(folder_name)", index_node, *time_lookups(cursor, args.fcls, args.repeat)))
+
+        print(f"\n{'Variante':<26}{'Plan':<20}{'ms/consulta':>12}{'imágenes':>10}")
+        for name, node, ms, images in results:
+            print(f"{name:<26}{node:<20}{ms:>12.2f}{images:>10.1f}")
+        print(f"\n⚡ Aceleración: {results[0][2] / results[1][2]:.1f}x")
+    finally:
+        connection.rollback()
+        connection.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -57,9 +57,21 @@ fi
 print_status "Deteniendo contenedores existentes..."
 docker-compose down 2>/dev/null || true
 
-# Construir y ejecutar
-print_status "Construyendo y ejecutando la aplicación..."
-docker-compose up -d --build
+# Construir la imagen
+print_status "Construyendo la aplicación..."
+docker-compose build
+
+# Aplicar las migraciones de la base de datos antes de levantar la aplicación
+print_status "Aplicando migraciones de la base de datos..."
+docker-compose run --rm --no-deps pt-calidad python -m utils.db_migrations
+
+# Copiar a las tablas binarias las imágenes base64 pendientes; luego las mantiene al día image-sync
+print_status "Sincronizando imágenes con las tablas binarias..."
+docker-compose run --rm --no-deps pt-calidad python -m utils.image_db fcl_drive despacho
+
+# Ejecutar
+print_status "Ejecutando la aplicación..."
+docker-compose up -d
 
 # Esperar un momento para que la aplicación se inicie
 print_status "Esperando que la aplicación se inicie..."
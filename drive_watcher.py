@@ -0,0 +1,196 @@
+"""
+Watcher de Google Drive para la ingesta continua de imágenes
+
+Proceso independiente de Streamlit que sigue el feed `changes.list` de Drive
+con un page token persistido. Cada cambio dentro de la carpeta raíz FOLDER_ID
+(una carpeta FCL nueva o una imagen nueva/modificada en una carpeta FCL) se
+ingesta de forma incremental en el almacén de imágenes, así los usuarios no
+esperan la ingesta y el visor siempre tiene las imágenes recientes.
+
+Uso:
+    python drive_watcher.py                 # sondeo continuo cada 60 s
+    python drive_watcher.py --once          # procesar los cambios pendientes y salir
+    python drive_watcher.py --backfill SEF  # ingerir antes las carpetas que contengan "SEF"
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from googleapiclient.errors import HttpError
+from utils.get_sheets import authenticate_google_drive, list_folders, FOLDER_ID
+from utils.image_ingest import collect_pending, iter_pending, ingest_images
+from utils.image_store import get_image_store
+
+FOLDER_MIME_TYPE = "application/vnd.google-apps.folder"
+POLL_INTERVAL = 60
+CHANGE_FIELDS = (
+    "nextPageToken, newStartPageToken, "
+    "changes(fileId, removed, file(id, name, mimeType, parents, trashed, size, "
+    "webViewLink, modifiedTime, md5Checksum))"
+)
+FOLDER_FIELDS = "id, name, parents, webViewLink, modifiedTime"
+
+
+class DriveWatcher:
+    """Sigue los cambios de Drive y los ingesta en el almacén de imágenes"""
+
+    def __init__(self, service, root_folder_id=FOLDER_ID, image_store=None):
+        self.service = service
+        self.root_folder_id = root_folder_id
+        self.image_store = image_store or get_image_store()
+        self.token_path = os.path.join(self.image_store.root, "drive_changes_token.json")
+        # id de carpeta -> carpeta FCL, o None si no cuelga de la raíz
+        self._folders = {}
+
+    def load_token(self):
+        try:
+            with open(self.token_path, "r", encoding="utf-8") as f:
+                return json.load(f).get("page_token")
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def save_token(self, page_token):
+        tmp_path = f"{self.token_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"page_token": page_token}, f)
+        os.replace(tmp_path, self.token_path)
+
+    def start_token(self):
+        """Token actual del feed; los cambios anteriores no se reciben"""
+        response = self.service.changes().getStartPageToken(supportsAllDrives=True).execute()
+        return response["startPageToken"]
+
+    def fcl_folder(self, folder_id):
+        """Carpeta FCL si `folder_id` cuelga directamente de la raíz, si no None"""
+        if folder_id not in self._folders:
+            try:
+                folder = self.service.files().get(
+                    fileId=folder_id, fields=FOLDER_FIELDS, supportsAllDrives=True
+                ).execute()
+            except HttpError as e:
+                # Carpetas fuera del alcance de la cuenta de servicio
+                print(f"⚠️ No se pudo consultar la carpeta {folder_id}: {e}")
+                folder = {}
+            self._folders[folder_id] = folder if self.root_folder_id in folder.get("parents", []) else None
+        return self._folders[folder_id]
+
+    def classify(self, changes):
+        """
+        Carpetas FCL nuevas e imágenes cambiadas de una página del feed
+
+        Returns:
+            (list de carpetas nuevas, dict id de carpeta -> (carpeta, [imágenes]))
+        """
+        new_folders = []
+        images_by_folder = {}
+        for change in changes:
+            file = change.get("file")
+            if change.get("removed") or not file or file.get("trashed"):
+                continue
+            parents = file.get("parents", [])
+
+            if file.get("mimeType") == FOLDER_MIME_TYPE:
+                if self.root_folder_id in parents:
+                    self._folders[file["id"]] = file
+                    new_folders.append(file)
+                continue
+
+            if not file.get("mimeType", "").startswith("image/"):
+                continue
+            for parent_id in parents:
+                folder = self.fcl_folder(parent_id)
+                if folder is not None:
+                    images_by_folder.setdefault(parent_id, (folder, []))[1].append(file)
+        return new_folders, images_by_folder
+
+    def ingest_changes(self, changes):
+        """Ingestar una página de cambios; retorna las filas agregadas"""
+        new_folders, images_by_folder = self.classify(changes)
+
+        # Las carpetas nuevas se listan completas; las conocidas solo con sus imágenes cambiadas
+        pending = collect_pending(self.service, new_folders, self.image_store)
+        listed = {folder["id"] for folder in new_folders}
+        for folder_id, (folder, images) in images_by_folder.items():
+            if folder_id in listed:
+                continue
+            changed = self.image_store.select_changed(images)
+            pending.extend((folder, image) for image in changed)
+
+        if not pending:
+            return 0
+        print(f"🔄 {len(pending)} imágenes nuevas o modificadas en Drive")
+        return len(ingest_images(pending, self.image_store))
+
+    def poll(self):
+        """Procesar todos los cambios pendientes desde el último token"""
+        page_token = self.load_token()
+        if page_token is None:
+            page_token = self.start_token()
+            self.save_token(page_token)
+            print("✅ Watcher inicializado; se ingestarán los cambios desde ahora")
+            return 0
+
+        ingested = 0
+        while page_token:
+            response = self.service.changes().list(
+                pageToken=page_token,
+                pageSize=1000,
+                spaces="drive",
+                fields=CHANGE_FIELDS,
+                includeItemsFromAllDrives=True,
+                supportsAllDrives=True,
+            ).execute()
+            ingested += self.ingest_changes(response.get("changes", []))
+
+            # El token se guarda después de ingestar la página: ante una caída se reprocesa
+            # y el almacén descarta lo ya registrado
+            if "newStartPageToken" in response:
+                self.save_token(response["newStartPageToken"])
+                break
+            page_token = response.get("nextPageToken")
+            self.save_token(page_token)
+        return ingested
+
+    def backfill(self, fcl):
+        """Ingestar todas las carpetas FCL cuyo nombre contenga `fcl`"""
+        folders = list_folders(self.service, self.root_folder_id, fcl)
+        for folder in folders:
+            self._folders[folder["id"]] = folder
+        pending = iter_pending(self.service, folders, self.image_store)
+        return len(ingest_images(pending, self.image_store))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingesta continua de imágenes desde Google Drive")
+    parser.add_argument("--interval", type=int, default=POLL_INTERVAL, help="Segundos entre sondeos")
+    parser.add_argument("--once", action="store_true", help="Procesar los cambios pendientes y salir")
+    parser.add_argument("--backfill", metavar="FCL", help="Ingerir antes las carpetas cuyo nombre contenga FCL")
+    args = parser.parse_args(argv)
+
+    service = authenticate_google_drive()
+    if not service:
+        print("❌ No se pudo conectar con Google Drive")
+        return 1
+
+    watcher = DriveWatcher(service)
+    if args.backfill is not None:
+        print(f"📁 Backfill de carpetas '{args.backfill}': {watcher.backfill(args.backfill)} imágenes")
+
+    while True:
+        try:
+            ingested = watcher.poll()
+            if ingested:
+                print(f"✅ {ingested} imágenes ingestadas")
+        except Exception as e:
+            print(f"⚠️ Error al procesar cambios de Drive: {e}")
+            if args.once:
+                return 1
+        if args.once:
+            return 0
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,49 @@
+"""
+SQL que arma utils.db_migrations, sin conexión a la base de datos
+"""
+
+import pytest
+
+pytest.importorskip("psycopg2")
+
+from utils.db_migrations import (
+    FCL_KEY_EXPR, MIGRATIONS, fcl_key, fcl_filter, fcl_index_sql,
+)
+
+
+def test_fcl_key_strips_like_the_index_expression():
+    assert FCL_KEY_EXPR == "TRIM(folder_name)"
+    assert fcl_key("  FCL-12 ") == "FCL-12"
+    assert fcl_key(1234) == "1234"
+
+
+def test_fcl_filter_uses_the_indexed_expression():
+    where, params = fcl_filter(" FCL-12  ")
+
+    assert where == "TRIM(folder_name) = %s"
+    assert params == ("FCL-12",)
+
+
+def test_fcl_index_sql():
+    assert fcl_index_sql() == (
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_images_fcl_drive_fcl "
+        "ON images_fcl_drive ((TRIM(folder_name)))"
+    )
+    assert fcl_index_sql("bench", "idx_bench", concurrently=False) == (
+        "CREATE INDEX IF NOT EXISTS idx_bench ON bench ((TRIM(folder_name)))"
+    )
+
+
+def test_migrations_are_unique_and_ordered():
+    ids = [migration['id'] for migration in MIGRATIONS]
+
+    assert len(ids) == len(set(ids))
+    assert ids == sorted(ids)
+
+
+def test_concurrent_indexes_declare_their_name():
+    # _drop_invalid_index necesita el nombre para limpiar un intento interrumpido
+    for migration in MIGRATIONS:
+        if "CONCURRENTLY" in migration['sql']:
+            assert migration.get('index')
+            assert migration['index'] in migration['sql']
@@ -0,0 +1,101 @@
+"""
+ImageStore en un directorio temporal: blobs por hash, miniaturas e índice
+"""
+
+import io
+import hashlib
+
+import pytest
+
+pytest.importorskip("pandas")
+pytest.importorskip("pyarrow")
+pytest.importorskip("filelock")
+PILImage = pytest.importorskip("PIL.Image")
+
+from utils.image_store import ImageStore, make_thumbnail, image_dimensions, decode_base64_image
+
+
+def jpeg_bytes(size=(640, 480), color=(200, 30, 60)):
+    output = io.BytesIO()
+    PILImage.new("RGB", size, color).save(output, format="JPEG")
+    return output.getvalue()
+
+
+def record(image_id, folder_name="FCL-1", image_bytes=None, md5=None):
+    return {
+        'folder_id': f"folder-{folder_name}",
+        'folder_name': folder_name,
+        'image_id': image_id,
+        'image_name': f"{image_id}.jpg",
+        'image_md5': md5 or image_id,
+        'image_modifiedTime': "2026-01-01T00:00:00Z",
+        'image_bytes': image_bytes,
+    }
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ImageStore(root=str(tmp_path / "store"))
+
+
+def test_put_blob_is_content_addressed(store):
+    image = jpeg_bytes()
+    image_hash = store.put_blob(image)
+
+    assert image_hash == hashlib.sha256(image).hexdigest()
+    assert store.put_blob(image) == image_hash
+    assert store.get_bytes(image_hash) == image
+
+
+def test_make_thumbnail_fits_the_requested_side():
+    thumbnail = make_thumbnail(jpeg_bytes((1200, 600)), size=256)
+
+    with PILImage.open(io.BytesIO(thumbnail)) as img:
+        assert img.format == "JPEG"
+        assert max(img.size) <= 256
+    assert image_dimensions(thumbnail)[0] == 256
+
+
+def test_image_dimensions_of_invalid_bytes():
+    assert image_dimensions(b"not an image") == (None, None)
+
+
+def test_decode_base64_image_with_data_prefix():
+    assert decode_base64_image("data:image/jpeg;base64,aGVsbG8=") == b"hello"
+    assert decode_base64_image("aGVsbG8=") == b"hello"
+
+
+def test_index_round_trip(store):
+    first, second = jpeg_bytes(color=(10, 10, 10)), jpeg_bytes(color=(250, 250, 250))
+    added = store.add_images([record("a", image_bytes=first), record("b", image_bytes=second)])
+
+    assert sorted(added['image_id']) == ["a", "b"]
+    hashes = store.get_image_hashes("FCL-1")
+    assert sorted(hashes) == sorted(hashlib.sha256(image).hexdigest() for image in (first, second))
+    assert [store.put_thumbnail(h) for h in hashes] == store.get_thumbnail_paths("FCL-1")
+
+    # Otra instancia sobre el mismo directorio lee el mismo índice
+    reopened = ImageStore(root=store.root)
+    assert sorted(reopened.get_image_hashes("FCL-1")) == sorted(hashes)
+    assert reopened.get_image_hashes("FCL-2") == []
+
+
+def test_unchanged_images_are_not_added_again(store):
+    image = jpeg_bytes()
+    store.add_images([record("a", image_bytes=image)])
+
+    assert store.add_images([record("a", image_bytes=image)]).empty
+    changed = store.add_images([record("a", image_bytes=jpeg_bytes(color=(0, 0, 255)), md5="a2")])
+    assert list(changed['image_id']) == ["a"]
+    assert len(store.get_image_hashes("FCL-1")) == 1
+
+
+def test_iter_changed_skips_stored_images(store):
+    store.add_images([record("a", image_bytes=jpeg_bytes())])
+    listing = [
+        {'id': "a", 'md5Checksum': "a"},
+        {'id': "a2", 'md5Checksum': "x"},
+        {'id': "a", 'md5Checksum': "otro"},
+    ]
+
+    assert [image['md5Checksum'] for image in store.iter_changed(listing)] == ["x", "otro"]
@@ -0,0 +1,80 @@
+"""
+Sección de fotos del reporte PDF alimentada por un generador
+"""
+
+import io
+
+import pytest
+
+pytest.importorskip("pandas")
+pytest.importorskip("reportlab")
+PILImage = pytest.importorskip("PIL.Image")
+
+from reportlab.platypus import Image, Paragraph, Table
+
+from utils.pdf_generator import QualityControlReportGenerator, PDF_IMAGE_MAX_SIDE
+
+
+def jpeg_bytes(size=(2000, 1500)):
+    output = io.BytesIO()
+    PILImage.new("RGB", size, (90, 160, 40)).save(output, format="JPEG")
+    return output.getvalue()
+
+
+def texts(story):
+    return [flowable.getPlainText() for flowable in story if isinstance(flowable, Paragraph)]
+
+
+def image_cells(story):
+    return [cell for flowable in story if isinstance(flowable, Table) for cell in flowable._cellvalues[0]]
+
+
+def test_photos_section_consumes_a_generator_lazily():
+    consumed = []
+
+    def images():
+        for i in range(4):
+            consumed.append(i)
+            yield jpeg_bytes()
+
+    story = QualityControlReportGenerator()._create_photos_section(images())
+
+    assert consumed == [0, 1, 2, 3]
+    cells = image_cells(story)
+    # Dos filas de 3 columnas: 4 imágenes y 2 celdas vacías
+    assert len(cells) == 6
+    assert sum(isinstance(cell, Image) for cell in cells) == 4
+    assert "Total de imágenes incluidas: 4" in texts(story)
+
+
+def test_photos_are_downscaled_when_added():
+    generator = QualityControlReportGenerator()
+    cell = generator._pdf_image(jpeg_bytes(), 1, 100, 100)
+
+    # Tamaño en píxeles de la imagen que quedó en el story
+    assert max(cell.imageWidth, cell.imageHeight) <= PDF_IMAGE_MAX_SIDE
+
+
+def test_unreadable_image_becomes_a_placeholder():
+    story = QualityControlReportGenerator()._create_photos_section(iter([b"not an image", jpeg_bytes()]))
+
+    cells = image_cells(story)
+    assert isinstance(cells[0], Paragraph)
+    assert cells[0].getPlainText().startswith("Error imagen 1")
+    assert isinstance(cells[1], Image)
+
+
+def test_error_while_streaming_is_reported():
+    def images():
+        yield jpeg_bytes()
+        raise RuntimeError("conexión perdida")
+
+    story = QualityControlReportGenerator()._create_photos_section(images())
+
+    assert any("conexión perdida" in text for text in texts(story))
+
+
+def test_no_images():
+    story = QualityControlReportGenerator()._create_photos_section(None)
+
+    assert "No hay imágenes disponibles para este FCL" in texts(story)
@@ -0,0 +1,125 @@
+"""
+TokenCache contra un endpoint OAuth2 local que imita al de Microsoft
+"""
+
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("requests")
+
+from utils.get_token import TokenCache
+
+
+class StubTokenEndpoint:
+    """Servidor HTTP local que entrega tokens numerados y cuenta los POST"""
+
+    def __init__(self, expires_in=3600, delay=0.0):
+        self.expires_in = expires_in
+        self.delay = delay
+        self.requests = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                with stub._lock:
+                    stub.requests += 1
+                    number = stub.requests
+                time.sleep(stub.delay)
+                body = json.dumps({"access_token": f"token-{number}", "expires_in": stub.expires_in}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def credentials(self):
+        host, port = self.server.server_address
+        return {
+            "tenant_id": "tenant",
+            "client_id": "client",
+            "client_secret": "secret",
+            "authority": f"http://{host}:{port}",
+        }
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_concurrent_callers_share_one_request():
+    with StubTokenEndpoint(delay=0.2) as stub:
+        cache = TokenCache()
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(cache.get_token(stub.credentials)))
+            for _ in range(10)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert results == ["token-1"] * 10
+        assert stub.requests == 1
+
+
+def test_cached_token_is_reused():
+    with StubTokenEndpoint() as stub:
+        cache = TokenCache()
+        assert cache.get_token(stub.credentials) == "token-1"
+        assert cache.get_token(stub.credentials) == "token-1"
+        assert stub.requests == 1
+
+
+def test_refresh_in_background_near_expiry():
+    with StubTokenEndpoint(expires_in=2) as stub:
+        cache = TokenCache(refresh_margin=1)
+        assert cache.get_token(stub.credentials) == "token-1"
+
+        time.sleep(1.1)
+        # Dentro del margen se devuelve el token vigente y se renueva de fondo
+        assert cache.get_token(stub.credentials) == "token-1"
+        assert wait_until(lambda: cache.get_token(stub.credentials) == "token-2")
+        assert stub.requests == 2
+
+
+def test_margin_longer_than_token_life_is_clamped():
+    with StubTokenEndpoint(expires_in=2) as stub:
+        cache = TokenCache(refresh_margin=300)
+        for _ in range(5):
+            assert cache.get_token(stub.credentials) == "token-1"
+        assert stub.requests == 1
+
+
+def test_invalidate_forces_new_request():
+    with StubTokenEndpoint() as stub:
+        cache = TokenCache()
+        assert cache.get_token(stub.credentials) == "token-1"
+        cache.invalidate(stub.credentials)
+        assert cache.get_token(stub.credentials) == "token-2"
@@ -0,0 +1,276 @@
+"""
+Motor de datos de producto terminado
+
+Pipeline único descarga → limpieza → categorización de la BD de evaluación
+de calidad de producto terminado, compartido por las vistas de muestras y
+de producto terminado para que el libro se descargue y cachee una sola vez.
+"""
+
+import streamlit as st
+import pandas as pd
+from utils.get_api import iter_archivos_en_carpeta_compartida, get_download_url_by_name, get_item_by_name
+from utils.graph_client import download_file
+from utils.download_cache import download_cache, item_version
+from utils.snapshot_store import snapshot_store
+from utils.get_token import get_access_token, get_access_token_alza
+
+
+# Reglas de categorización de presentaciones: (subcadena, categoría) en orden
+# de prioridad. Se evalúan sobre la presentación en mayúsculas y sin espacios.
+PRESENTATION_RULES = [
+    ("4.4", "4.4 OZ"),
+    ("3.3", "BANDEJA BLANCA 3.3KG"),
+    ("3KG", "BANDEJA BLANCA 3KG"),
+    ("8X18OZ", "8X18 OZ"),
+    ("9.8OZ", "9.8 OZ PINTA PLANA"),
+    ("6OZ", "6 OZ"),
+    ("12X18", "12X18 OZ"),
+    #("BANDEJA", "BANDEJA"),
+]
+
+
+def categorize_presentation(presentation, rules=PRESENTATION_RULES):
+    """Categoría de una presentación según la primera regla que coincida"""
+    if pd.isna(presentation):
+        return "NO_ESPECIFICADO"
+    presentation_upper = str(presentation).upper()
+
+    for pattern, category in rules:
+        if pattern in presentation_upper:
+            return category
+    return presentation_upper
+
+
+def categorize_presentations(presentations, rules=PRESENTATION_RULES):
+    """
+    Categorizar una columna de presentaciones de forma vectorizada
+
+    Las reglas se evalúan solo sobre los valores únicos (decenas) y el
+    resultado se mapea de vuelta a las filas (decenas de miles).
+
+    Args:
+        presentations (pandas.Series): Presentaciones tal como vienen del Excel
+        rules (list): Reglas (subcadena, categoría); por defecto PRESENTATION_RULES
+
+    Returns:
+        pandas.Series con la categoría de cada fila
+    """
+    mapping = {
+        value: categorize_presentation(str(value).upper().replace(" ", ""), rules)
+        for value in presentations.dropna().unique()
+    }
+    return presentations.map(mapping).fillna("NO_ESPECIFICADO")
+
+
+SOURCE_DRIVE_ID = "b!k0xKW2h1VkGnxasDN0z40PeA8yi0BwBKgEf_EOEPStmAWVEVjX8MQIydW1yMzk1b"
+SOURCE_FOLDER_ID = "01SPKVU4I6RWNBBAVFIJF3GHBOYOFMUKZS"
+SOURCE_FILE_NAME = "BD EVALUACION DE CALIDAD DE PRODUCTO TERMINADO.xlsx"
+SOURCE_SHEET_NAME = "CALIDAD PRODUCTO TERMINADO"
+# Incrementar al cambiar normalize_data o PRESENTATION_RULES para invalidar snapshots
+NORMALIZE_VERSION = 3
+
+# Mapeo PRODUCTOR → EMPRESA de la vista de producto terminado
+EMPRESA_MAPPING = {
+    'GMH BERRIES S.A.C': 'AGRICOLA BLUE GOLD S.A.C.',
+    'BIG BERRIES S.A.C': 'AGRICOLA BLUE GOLD S.A.C.',
+    'CANYON BERRIES S.A.C': 'AGRICOLA BLUE GOLD S.A.C.',
+    'AGRICOLA BLUE GOLD S.A.C': 'AGRICOLA BLUE GOLD S.A.C.',
+    'EXCELLENCE FRUIT S.A.C': "SAN LUCAR S.A.",
+    'GAP BERRIES S.A.C': "SAN LUCAR S.A.",
+    'SAN EFISIO S.A.C': "SAN LUCAR S.A.",
+    'TARA FARMS S.A.C': "SAN LUCAR S.A.",
+}
+# La vista de muestras además agrupa QBERRIES con SAN LUCAR
+EMPRESA_MAPPING_MUESTRAS = {
+    **EMPRESA_MAPPING,
+    'QBERRIES S.A.C': "SAN LUCAR S.A.",
+}
+
+
+@st.cache_data(show_spinner=False, ttl=300)
+def get_source_item():
+    """driveItem de la BD de evaluación (solo metadatos: id, cTag, downloadUrl)"""
+    access_token = get_access_token()
+    # La búsqueda se detiene en la página donde aparece el archivo
+    DATAS = iter_archivos_en_carpeta_compartida(access_token, SOURCE_DRIVE_ID, SOURCE_FOLDER_ID)
+    return get_item_by_name(DATAS, SOURCE_FILE_NAME)
+
+
+def get_data():
+    """
+    Hoja cruda de la BD de evaluación, servida desde su snapshot por cTag
+
+    Las vistas no usan este frame directamente: `clean_data` guarda su propio
+    snapshot ya normalizado ("producto_terminado_limpio"), así que en un
+    arranque en frío con el archivo sin cambios no se vuelve a limpiar.
+    """
+    item = get_source_item()
+    # Solo se descarga y parsea si cambió el cTag del archivo
+    df = download_cache.load_frame(
+        item,
+        lambda path: pd.read_excel(path, sheet_name=SOURCE_SHEET_NAME),
+        key=SOURCE_SHEET_NAME,
+    )
+    return df
+
+
+@st.cache_data(show_spinner="Cargando images...",ttl=500)
+def get_images():
+    """Cargar solo metadatos de imágenes para optimizar rendimiento"""
+    access_token = get_access_token_alza()
+    DATAS = iter_archivos_en_carpeta_compartida(access_token, "b!M5ucw3aa_UqBAcqv3a6affR7vTZM2a5ApFygaKCcATxyLdOhkHDiRKl9EvzaYbuR", "01XOBWFSBLVGULAQNEKNG2WR7CPRACEN7Q")
+    data_ = download_file(get_download_url_by_name(DATAS, "imges_url_gd_calidad.parquet"))
+    df = pd.read_parquet(data_)
+    df["folder_name"] = df["folder_name"].str.strip()
+    df = df.groupby(["folder_name"]).agg({
+        "image_download_url": lambda x: x.tolist(),
+        "image_thumbnail_url": lambda x: x.tolist(),
+    }).reset_index()
+    return df
+
+def normalize_data(df):
+    """
+    Limpiar, tipar, ordenar y categorizar el frame crudo de la BD de evaluación
+
+    La columna EMPRESA no se calcula aquí: cada vista agrupa los productores
+    con su propio mapeo (ver `clean_data`).
+    """
+    
+    # Convertir fechas una sola vez
+    df["FECHA DE MP"] = pd.to_datetime(df["FECHA DE MP"])
+    df["FECHA DE PROCESO"] = pd.to_datetime(df["FECHA DE PROCESO"])
+
+    # Fill NaN values with 0 for all float columns
+    float_columns = df.select_dtypes(include=['float64']).columns
+    df[float_columns] = df[float_columns].fillna(0)
+
+    # Limpiar datos de manera más eficiente
+    replacements = {
+        "MODULO ": {"`1": 1},
+        "TURNO ": {"Dia": 2, 111: 11},
+        "N° FCL": ['None', 'nan', 'NaN', 'NULL', 'null', ''],
+        "TRAZABILIDAD": ['None', 'nan', 'NaN', 'NULL', 'null', ''],
+        "OBSERVACIONES": ['None', 'nan', 'NaN', 'NULL', 'null', '']
+    }
+    
+    # Aplicar reemplazos de manera vectorizada
+    for col, values in replacements.items():
+        if col in df.columns:
+            if isinstance(values, dict):
+                df[col] = df[col].replace(values)
+            else:
+                df[col] = df[col].replace(values, "-")
+    
+    # Fill NaN values
+    df["TURNO "] = df["TURNO "].fillna(0)
+    df["VARIEDAD"] = df["VARIEDAD"].fillna("NO ESPECIFICADO")
+    df["PRESENTACION "] = df["PRESENTACION "].fillna("NO ESPECIFICADO")
+    df["DESTINO"] = df["DESTINO"].fillna("NO ESPECIFICADO")
+    df["TIPO DE CAJA"] = df["TIPO DE CAJA"].fillna("-")
+    df["TRAZABILIDAD"] = df["TRAZABILIDAD"].fillna("-")
+    
+    # Strip strings de manera vectorizada
+    string_columns = ["VARIEDAD", "PRESENTACION ", "DESTINO", "TIPO DE CAJA", "TRAZABILIDAD", "N° FCL"]
+    for col in string_columns:
+        if col in df.columns:
+            df[col] = df[col].astype(str).str.strip()
+
+    df = df[df["N° FCL"] != "-"]
+    df = df[df["N° FCL"] != "nan"]
+    df = df[df["N° FCL"] != "NaN"]
+    df = df[df["N° FCL"] != "None"]
+    df = df[df["N° FCL"].notna()]  # Eliminar valores NaN de pandas
+    df.columns = df.columns.str.strip()
+    
+    numeric_columns = df.select_dtypes(include=['float64', 'int64']).columns
+    df[numeric_columns] = df[numeric_columns].fillna(0)
+
+    #df = df[df["EMPRESA"] == "SAN LUCAR S.A."]
+    df = df.sort_values(by="FECHA DE PROCESO", ascending=False)
+    df["PRESENTACION"] = categorize_presentations(df["PRESENTACION"])
+    return df
+
+
+class FclIndex:
+    """
+    Índice secundario N° FCL → posiciones de fila de un frame
+
+    Se construye una vez con `groupby(...).indices` y permite obtener todas
+    las filas de un FCL, o la primera (la más reciente si el frame está
+    ordenado por fecha), sin recorrer el frame completo.
+    """
+
+    def __init__(self, df, column="N° FCL"):
+        self.df = df
+        self.column = column
+        self.positions = df.groupby(column, sort=False).indices
+        self.fcls = sorted(self.positions)
+
+    def __contains__(self, fcl):
+        return fcl in self.positions
+
+    def __len__(self):
+        return len(self.positions)
+
+    def rows(self, fcl):
+        """Todas las filas del FCL (frame vacío si no existe)"""
+        positions = self.positions.get(fcl)
+        if positions is None:
+            return self.df.iloc[0:0]
+        return self.df.iloc[positions]
+
+    def first(self, fcl):
+        """Primera fila del FCL como Series, o None si no existe"""
+        positions = self.positions.get(fcl)
+        if positions is None:
+            return None
+        return self.df.iloc[positions[0]]
+
+
+@st.cache_resource(show_spinner="Procesando datos...", max_entries=2)
+def _clean_data_for_version(version):
+    return snapshot_store.get_or_build(
+        "producto_terminado_limpio",
+        f"{version}|v{NORMALIZE_VERSION}",
+        lambda: normalize_data(get_data()),
+    )
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _company_data_for_version(version, empresa, empresa_mapping):
+    df = _clean_data_for_version(version).copy(deep=False)
+    df["EMPRESA"] = df["PRODUCTOR"].replace(empresa_mapping)
+    if empresa is not None:
+        df = df[df["EMPRESA"] == empresa]
+    return df, FclIndex(df)
+
+
+def clean_data(empresa=None, empresa_mapping=EMPRESA_MAPPING_MUESTRAS):
+    """
+    Frame limpio y ordenado, cacheado por versión del archivo de origen
+
+    Un rerun que solo cambia filtros de la vista cuesta una consulta al
+    cache. El frame se comparte entre sesiones: las vistas deben filtrarlo
+    o copiarlo, nunca modificarlo en sitio.
+
+    Args:
+        empresa (str): Si se indica, solo las filas de esa EMPRESA
+        empresa_mapping (dict): Mapeo PRODUCTOR → EMPRESA propio de la vista
+    """
+    version = item_version(get_source_item())
+    return _company_data_for_version(version, empresa, empresa_mapping)[0]
+
+
+def get_fcl_index(empresa=None, empresa_mapping=EMPRESA_MAPPING_MUESTRAS):
+    """Índice por N° FCL del frame limpio (cacheado junto con él)"""
+    return _company_data_for_version(item_version(get_source_item()), empresa, empresa_mapping)[1]
+
+
+def get_fcl_rows(fcl, empresa=None, empresa_mapping=EMPRESA_MAPPING_MUESTRAS):
+    """Todas las filas de un FCL"""
+    return get_fcl_index(empresa, empresa_mapping).rows(fcl)
+
+
+def get_fcl_summary(fcl, empresa=None, empresa_mapping=EMPRESA_MAPPING_MUESTRAS):
+    """Primera fila (la más reciente) de un FCL, o None"""
+    return get_fcl_index(empresa, empresa_mapping).first(fcl)
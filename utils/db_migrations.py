@@ -0,0 +1,225 @@
+"""
+Migraciones del esquema PostgreSQL usado por la aplicación
+
+Las tablas heredadas de imágenes las crea el proceso de carga; aquí se agregan
+los índices que necesitan las consultas de la aplicación y las tablas de
+imágenes binarias de utils.image_db. Cada migración se registra en
+`schema_migrations` y se aplica una sola vez. Los índices se crean con
+CONCURRENTLY para no bloquear las escrituras en tablas grandes.
+
+Se aplican como paso del despliegue (deploy.sh), antes de levantar la
+aplicación.
+
+Uso:
+    python -m utils.db_migrations           # aplicar las migraciones pendientes
+"""
+
+import sys
+import psycopg2
+from psycopg2 import errors
+
+# Expresión por la que se buscan las imágenes de un FCL; el índice de
+# images_fcl_drive se define sobre esta misma expresión, así que las
+# consultas deben filtrar exactamente por ella para poder usarlo
+FCL_KEY_EXPR = "TRIM(folder_name)"
+# Lo mismo para images_onedrive_despacho
+DESPACHO_KEY_EXPR = "TRIM(name)"
+# Clave de pg_advisory_lock para no aplicar migraciones desde dos procesos a la vez
+MIGRATION_LOCK_KEY = 7318201
+
+
+def fcl_key(fcl):
+    """Valor normalizado del FCL, comparable con FCL_KEY_EXPR"""
+    return f"{fcl}".strip()
+
+
+def fcl_filter(fcl):
+    """
+    Condición WHERE por FCL que aprovecha el índice de expresión
+
+    Returns:
+        (sql, params) para concatenar a una consulta sobre images_fcl_drive
+    """
+    return f"{FCL_KEY_EXPR} = %s", (fcl_key(fcl),)
+
+
+def fcl_index_sql(table="images_fcl_drive", index_name="idx_images_fcl_drive_fcl", concurrently=True):
+    """CREATE INDEX sobre FCL_KEY_EXPR para `table`"""
+    concurrently = "CONCURRENTLY " if concurrently else ""
+    return f"CREATE INDEX {concurrently}IF NOT EXISTS {index_name} ON {table} (({FCL_KEY_EXPR}))"
+
+
+MIGRATIONS = [
+    {
+        'id': '001_images_fcl_drive_fcl_index',
+        'index': 'idx_images_fcl_drive_fcl',
+        'sql': fcl_index_sql(),
+    },
+    {
+        'id': '002_images_onedrive_despacho_name_index',
+        'index': 'idx_images_onedrive_despacho_name',
+        'sql': "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_images_onedrive_despacho_name "
+               "ON images_onedrive_despacho (name)",
+    },
+    {
+        # Imágenes binarias direccionadas por SHA-256; JPEG ya viene comprimido,
+        # así que STORAGE EXTERNAL evita que TOAST intente comprimirlo
+        'id': '003_image_blobs',
+        'sql': """
+            CREATE TABLE IF NOT EXISTS image_blobs (
+                hash TEXT PRIMARY KEY,
+                data BYTEA NOT NULL
+            );
+            ALTER TABLE image_blobs ALTER COLUMN data SET STORAGE EXTERNAL;
+        """,
+    },
+    {
+        # Metadatos sin el blob; el UNIQUE también sirve para buscar por FCL
+        'id': '004_image_metadata',
+        'sql': """
+            CREATE TABLE IF NOT EXISTS image_metadata (
+                id BIGSERIAL PRIMARY KEY,
+                source TEXT NOT NULL,
+                folder_key TEXT NOT NULL,
+                image_name TEXT,
+                hash TEXT NOT NULL REFERENCES image_blobs (hash),
+                size_bytes INTEGER,
+                width INTEGER,
+                height INTEGER,
+                created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                UNIQUE (source, folder_key, hash)
+            );
+        """,
+    },
+    {
+        # Filas heredadas de cada FCL al migrarlo; si la tabla heredada ya no
+        # tiene esa cantidad, el FCL se vuelve a leer de ella hasta re-migrarlo
+        'id': '005_image_migrations',
+        'sql': """
+            CREATE TABLE IF NOT EXISTS image_migrations (
+                source TEXT NOT NULL,
+                folder_key TEXT NOT NULL,
+                legacy_rows INTEGER NOT NULL,
+                migrated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                PRIMARY KEY (source, folder_key)
+            );
+        """,
+    },
+    {
+        # utils.image_db busca los despachos por DESPACHO_KEY_EXPR, que el
+        # índice simple de 002 sobre name no cubre
+        'id': '006_images_onedrive_despacho_name_trim_index',
+        'index': 'idx_images_onedrive_despacho_name_trim',
+        'sql': "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_images_onedrive_despacho_name_trim "
+               f"ON images_onedrive_despacho (({DESPACHO_KEY_EXPR}))",
+    },
+    {
+        # Índice por FCL que reemplaza al UNIQUE de 004 (se elimina en 008)
+        'id': '007_image_metadata_folder_index',
+        'index': 'idx_image_metadata_folder',
+        'sql': "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_image_metadata_folder "
+               "ON image_metadata (source, folder_key, id)",
+    },
+    {
+        # Cada fila heredada es una fila de metadatos, aunque dos fotos de un
+        # FCL sean idénticas: así los conteos coinciden con la tabla heredada.
+        # Los blobs se siguen guardando una sola vez por hash
+        'id': '008_image_metadata_allow_duplicates',
+        'sql': "ALTER TABLE image_metadata DROP CONSTRAINT IF EXISTS image_metadata_source_folder_key_hash_key",
+    },
+]
+
+
+def _applied_migrations(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            id TEXT PRIMARY KEY,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    """)
+    cursor.execute("SELECT id FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def _drop_invalid_index(cursor, index_name):
+    # Un CREATE INDEX CONCURRENTLY interrumpido deja el índice marcado como
+    # inválido, y IF NOT EXISTS lo daría por creado
+    cursor.execute("""
+        SELECT 1 FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = %s AND NOT i.indisvalid
+    """, (index_name,))
+    if cursor.fetchone():
+        print(f"⚠️ Eliminando índice inválido {index_name}")
+        cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}")
+
+
+def apply_migrations(connection, migrations=MIGRATIONS, wait=True):
+    """
+    Aplicar las migraciones pendientes
+
+    Se ejecutan en autocommit (CREATE INDEX CONCURRENTLY no admite
+    transacciones). Si una tabla todavía no existe, su migración se omite y se
+    vuelve a intentar la próxima vez.
+
+    Args:
+        connection: Conexión psycopg2
+        migrations (list): Migraciones con id, sql e índice que crean
+        wait (bool): Esperar el lock si otro proceso está migrando; con False
+            no se aplica nada y se deja la migración a ese proceso
+
+    Returns:
+        list: ids de las migraciones aplicadas
+    """
+    applied = []
+    autocommit = connection.autocommit
+    connection.autocommit = True
+    try:
+        with connection.cursor() as cursor:
+            if wait:
+                cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_KEY,))
+            else:
+                cursor.execute("SELECT pg_try_advisory_lock(%s)", (MIGRATION_LOCK_KEY,))
+                if not cursor.fetchone()[0]:
+                    print("⚠️ Otro proceso está aplicando las migraciones; se omiten")
+                    return applied
+            try:
+                done = _applied_migrations(cursor)
+                for migration in migrations:
+                    if migration['id'] in done:
+                        continue
+                    if migration.get('index'):
+                        _drop_invalid_index(cursor, migration['index'])
+                    try:
+                        cursor.execute(migration['sql'])
+                    except errors.UndefinedTable:
+                        print(f"⚠️ Migración {migration['id']} omitida: la tabla no existe")
+                        continue
+                    cursor.execute("INSERT INTO schema_migrations (id) VALUES (%s)", (migration['id'],))
+                    print(f"✅ Migración aplicada: {migration['id']}")
+                    applied.append(migration['id'])
+            finally:
+                cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_KEY,))
+    finally:
+        connection.autocommit = autocommit
+    return applied
+
+
+def main():
+    from utils.handler_db import DB_CONFIG
+
+    try:
+        connection = psycopg2.connect(**DB_CONFIG)
+    except psycopg2.Error as e:
+        print(f"❌ No se pudo conectar con la base de datos: {e}")
+        return 1
+    try:
+        applied = apply_migrations(connection)
+        print(f"✅ {len(applied)} migraciones aplicadas" if applied else "✅ El esquema está al día")
+    finally:
+        connection.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
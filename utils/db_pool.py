@@ -0,0 +1,119 @@
+"""
+Pool de conexiones PostgreSQL compartido por el proceso
+
+Las conexiones se reutilizan entre consultas en lugar de abrir una nueva
+(con su handshake y autenticación) en cada llamada. Al entregar una conexión
+se verifica que siga viva, y se recicla tras MAX_USES usos para no acumular
+estado de sesión en el servidor.
+"""
+
+import threading
+from contextlib import contextmanager
+import psycopg2
+from psycopg2 import pool as pg_pool
+from psycopg2.extensions import STATUS_READY
+
+POOL_MIN_SIZE = 1
+POOL_MAX_SIZE = 10
+# Usos tras los cuales la conexión se cierra y se abre una nueva
+MAX_USES = 500
+# Segundos esperando una conexión libre antes de fallar
+CHECKOUT_TIMEOUT = 10
+
+
+class ConnectionPool:
+    """ThreadedConnectionPool con espera acotada, verificación y reciclaje"""
+
+    def __init__(self, connect_kwargs, min_size=POOL_MIN_SIZE, max_size=POOL_MAX_SIZE,
+                 max_uses=MAX_USES, checkout_timeout=CHECKOUT_TIMEOUT):
+        self._pool = pg_pool.ThreadedConnectionPool(min_size, max_size, **connect_kwargs)
+        # ThreadedConnectionPool falla si se agota; el semáforo hace esperar en su lugar
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._uses = {}
+        self._lock = threading.Lock()
+        self.max_uses = max_uses
+        self.checkout_timeout = checkout_timeout
+
+    @staticmethod
+    def _is_healthy(connection):
+        if connection.closed:
+            return False
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            connection.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        """Tomar una conexión verificada; devolverla siempre con `putconn`"""
+        if not self._slots.acquire(timeout=self.checkout_timeout):
+            raise pg_pool.PoolError("No hay conexiones libres en el pool")
+        try:
+            # Si el servidor se reinició, todas las conexiones inactivas están muertas
+            for _ in range(self._pool.maxconn):
+                connection = self._pool.getconn()
+                if self._is_healthy(connection):
+                    return connection
+                self._discard(connection)
+            return self._pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _discard(self, connection):
+        with self._lock:
+            self._uses.pop(id(connection), None)
+        self._pool.putconn(connection, close=True)
+
+    def putconn(self, connection, close=False):
+        """Devolver una conexión; se cierra si está rota o cumplió MAX_USES"""
+        try:
+            with self._lock:
+                uses = self._uses.get(id(connection), 0) + 1
+                recycle = close or connection.closed or uses >= self.max_uses
+                if recycle:
+                    self._uses.pop(id(connection), None)
+                else:
+                    self._uses[id(connection)] = uses
+
+            if not recycle and connection.status != STATUS_READY:
+                try:
+                    connection.rollback()
+                except psycopg2.Error as e:
+                    # Si no se puede revertir, la conexión se cierra en vez de volver al pool
+                    print(f"⚠️ Conexión descartada, no se pudo revertir: {e}")
+                    recycle = True
+                    with self._lock:
+                        self._uses.pop(id(connection), None)
+            self._pool.putconn(connection, close=recycle)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """
+        Conexión del pool como context manager
+
+        Confirma la transacción al salir sin errores y la revierte si hubo
+        una excepción; las conexiones rotas no vuelven al pool.
+        """
+        connection = self.getconn()
+        broken = False
+        try:
+            yield connection
+            connection.commit()
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        except Exception:
+            if not connection.closed:
+                connection.rollback()
+            raise
+        finally:
+            self.putconn(connection, close=broken)
+
+    def close(self):
+        """Cerrar todas las conexiones del pool"""
+        self._pool.closeall()
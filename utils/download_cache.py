@@ -0,0 +1,102 @@
+"""
+Cache en disco de archivos de OneDrive / SharePoint validado por cTag/eTag
+
+Cada driveItem se guarda por su id junto con la etiqueta de versión que
+devolvió el listado. Si la etiqueta no cambió, no se vuelve a descargar el
+archivo ni a parsearlo: se sirve el snapshot Parquet de la última versión.
+"""
+
+import os
+import json
+from utils.graph_client import download_file
+from utils.snapshot_store import snapshot_store
+from utils.file_utils import safe_name, atomic_write
+
+CACHE_DIR = os.environ.get("DOWNLOAD_CACHE_DIR", os.path.join("data", "cache"))
+
+
+def item_version(item):
+    """Etiqueta de versión de un driveItem (cTag > eTag > fecha de modificación)"""
+    return item.get("cTag") or item.get("eTag") or item.get("lastModifiedDateTime")
+
+
+class DownloadCache:
+    """Cache de descargas indexado por id de driveItem"""
+
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = cache_dir
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _meta_path(self, item_id):
+        return os.path.join(self.cache_dir, f"{safe_name(item_id)}.json")
+
+    def _content_path(self, item_id, name):
+        ext = os.path.splitext(name or "")[1]
+        return os.path.join(self.cache_dir, f"{safe_name(item_id)}{ext}")
+
+    def _read_meta(self, item_id):
+        try:
+            with open(self._meta_path(item_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _write_meta(self, item_id, meta):
+        def write(path):
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+        atomic_write(self._meta_path(item_id), write)
+
+    def is_current(self, item):
+        """True si el archivo en disco corresponde a la versión actual del driveItem"""
+        meta = self._read_meta(item["id"])
+        return (
+            meta.get("version") == item_version(item)
+            and os.path.exists(self._content_path(item["id"], item.get("name")))
+        )
+
+    def fetch(self, item):
+        """
+        Ruta local del archivo, descargándolo solo si cambió su versión
+
+        Args:
+            item (dict): driveItem con id, name, cTag/eTag y @microsoft.graph.downloadUrl
+
+        Returns:
+            str: Ruta del archivo en el cache
+        """
+        content_path = self._content_path(item["id"], item.get("name"))
+        if self.is_current(item):
+            return content_path
+
+        print(f"⬇️ Descargando {item.get('name')} (versión {item_version(item)})")
+        data = download_file(item["@microsoft.graph.downloadUrl"])
+
+        def write(path):
+            with open(path, "wb") as f:
+                f.write(data.getbuffer())
+        atomic_write(content_path, write)
+        self._write_meta(item["id"], {"version": item_version(item), "name": item.get("name")})
+        return content_path
+
+    def load_frame(self, item, parser, key="default"):
+        """
+        DataFrame parseado del archivo, servido desde su snapshot mientras no cambie
+
+        Args:
+            item (dict): driveItem del listado
+            parser (callable): Función que recibe la ruta local y retorna un DataFrame
+            key (str): Identificador del parseo (p. ej. nombre de la hoja)
+
+        Returns:
+            pandas.DataFrame
+        """
+        return snapshot_store.get_or_build(
+            f"{item['id']}__{key}",
+            item_version(item),
+            lambda: parser(self.fetch(item)),
+        )
+
+
+# Instancia global del cache de descargas
+download_cache = DownloadCache()
@@ -0,0 +1,28 @@
+"""
+Utilidades de archivos compartidas por los caches y almacenes en disco
+"""
+
+import os
+import re
+import threading
+
+
+def safe_name(value):
+    """Nombre de archivo seguro a partir de un id o nombre arbitrario"""
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", str(value))
+
+
+def atomic_write(path, write_fn):
+    """
+    Escribir un archivo de forma atómica
+
+    `write_fn` recibe una ruta temporal única por proceso e hilo; el archivo
+    reemplaza a `path` solo si la escritura terminó sin errores.
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        write_fn(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
@@ -1,35 +1,45 @@
-import requests
 import time
 import pandas as pd
 import io
 from pathlib import Path
 from utils.get_token import get_access_token
+from utils.graph_client import graph_get
 from utils.config import load_config
 config = load_config()
 
-def listar_archivos_en_carpeta_compartida(access_token: str  ,drive_id: str, item_id: str):
+def iter_archivos_en_carpeta_compartida(access_token: str, drive_id: str, item_id: str):
     """
-    Lista los archivos dentro de una carpeta compartida en OneDrive / SharePoint usando Microsoft Graph.
+    Recorre los archivos de una carpeta compartida en OneDrive / SharePoint siguiendo
+    `@odata.nextLink`; cada página se pide solo cuando se consumió la anterior.
 
     :param access_token: Token de acceso válido con permisos Files.Read.All
     :param drive_id: El ID del drive compartido
     :param item_id: El ID de la carpeta compartida
-    :return: Lista de archivos o carpetas dentro de esa carpeta
+    :return: Generador de driveItems (archivos o carpetas)
     """
-    
     url = f"https://graph.microsoft.com/v1.0/drives/{drive_id}/items/{item_id}/children"
-    headers = {
-        "Authorization": f"Bearer {access_token}"
-    }
+    while url:
+        response = graph_get(url, access_token)
 
-    response = requests.get(url, headers=headers)
+        if response.status_code != 200:
+            print("❌ Error al obtener archivos:", response.status_code)
+            print(response.json())
+            return
+        data = response.json()
+        yield from data.get("value", [])
+        # nextLink ya incluye los parámetros de la página siguiente
+        url = data.get("@odata.nextLink")
 
-    if response.status_code == 200:
-        return response.json().get("value", [])
-    else:
-        print("❌ Error al obtener archivos:", response.status_code)
-        print(response.json())
-        return []
+def listar_archivos_en_carpeta_compartida(access_token: str  ,drive_id: str, item_id: str):
+    """
+    Lista los archivos dentro de una carpeta compartida en OneDrive / SharePoint usando Microsoft Graph.
+
+    :param access_token: Token de acceso válido con permisos Files.Read.All
+    :param drive_id: El ID del drive compartido
+    :param item_id: El ID de la carpeta compartida
+    :return: Lista de archivos o carpetas dentro de esa carpeta (todas las páginas)
+    """
+    return list(iter_archivos_en_carpeta_compartida(access_token, drive_id, item_id))
 
 def get_download_url_by_name(json_data, name):
     """
@@ -50,11 +60,7 @@ def test_json(access_token: str):
 
     
     url = f"https://graph.microsoft.com/v1.0/me/drive/sharedWithMe"
-    headers = {
-        "Authorization": f"Bearer {access_token}"
-    }
-
-    response = requests.get(url, headers=headers)
+    response = graph_get(url, access_token)
 
     if response.status_code == 200:
         return response.json()
@@ -62,3 +68,18 @@ def test_json(access_token: str):
         print("❌ Error al obtener archivos:", response.status_code)
         print(response.json())
         return []
+
+def get_item_by_name(json_data, name):
+    """
+    Busca en el JSON un archivo por su nombre y retorna el driveItem completo
+
+    Args:
+        json_data (list): Lista de diccionarios con información de archivos
+        name (str): Nombre del archivo a buscar
+
+    Returns:
+        dict: driveItem (id, eTag, cTag, lastModifiedDateTime, downloadUrl...), o None
+    """
+    for item in json_data:
+        if item.get('name') == name:
+            return item
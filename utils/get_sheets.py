@@ -1,8 +1,21 @@
 import re
 import io
+import os
+import time
+import random
+import ssl
+import json
+import socket
 import base64
+import threading
+import multiprocessing
+import httplib2
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
+from cachetools import TTLCache
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 from googleapiclient.http import MediaIoBaseDownload
 from PIL import Image
 import pandas as pd
@@ -32,6 +45,27 @@ SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
 SERVICE_ACCOUNT_FILE = 'nifty-might-269005-cd303aaaa33f.json'
 FOLDER_ID = '1OqY3VnNgsbnKRuqVZqFi6QSXqKDC4uox'
 
+# Solo se buscan carpetas FCL de la temporada actual
+SEASON_START = "2025-08-01T00:00:00"
+FOLDER_LIST_FIELDS = "id, name, webViewLink, modifiedTime"
+FOLDER_CACHE_TTL = 300
+_folder_cache = TTLCache(maxsize=256, ttl=FOLDER_CACHE_TTL)
+_folder_cache_lock = threading.Lock()
+
+# Descargas simultáneas contra Drive
+DOWNLOAD_WORKERS = 8
+DOWNLOAD_MAX_RETRIES = 5
+DOWNLOAD_BACKOFF_BASE = 1.0
+DOWNLOAD_BACKOFF_MAX = 32.0
+# Tareas en curso (o terminadas sin consumir) por worker antes de dejar de encolar
+PENDING_PER_WORKER = 2
+# Motivos de error 403 de Drive que indican cuota agotada
+RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}
+# Fallas de transporte del cliente de Drive que suelen ser pasajeras
+TRANSIENT_ERRORS = (httplib2.HttpLib2Error, ssl.SSLError, socket.timeout, ConnectionError, TimeoutError)
+# Procesos para decodificar/redimensionar/codificar (por defecto todos los núcleos)
+OPTIMIZE_WORKERS = int(os.environ.get("IMAGE_OPTIMIZE_WORKERS", "0")) or (os.cpu_count() or 1)
+
 def authenticate_google_drive():
        
     try:
@@ -42,10 +76,17 @@ def authenticate_google_drive():
     except Exception as e:
             print(f"Error de autenticación: {e}")
             return None
-def list_folders(service, folder_id,fcl):
-        
-    fecha_actual = datetime.now().strftime("%Y-%m-%d")
-    query = f"'{folder_id}' in parents and mimeType='application/vnd.google-apps.folder'"
+def _escape_query_value(value):
+    """Escapar un valor para usarlo entre comillas simples en el `q` de Drive"""
+    return str(value).replace("\\", "\\\\").replace("'", "\\'")
+
+def _query_folders(service, folder_id, modified_since):
+    """Carpetas hijas de la temporada, filtradas por fecha del lado de Drive"""
+    query = (
+        f"'{_escape_query_value(folder_id)}' in parents and mimeType='application/vnd.google-apps.folder' "
+        f"and trashed=false and modifiedTime >= '{modified_since}'"
+    )
+
     all_folders = []
     page_token = None
     page_count = 0
@@ -57,43 +98,75 @@ def list_folders(service, folder_id,fcl):
             q=query,
             pageSize=1000,
             pageToken=page_token,
-            fields="nextPageToken, files(id, name, mimeType, size, webViewLink,modifiedTime)"
+            fields=f"nextPageToken, files({FOLDER_LIST_FIELDS})"
         ).execute()
             
-        files = results.get('files', [])
-        all_folders.extend(files)
+        all_folders.extend(results.get('files', []))
         page_token = results.get('nextPageToken')
         if not page_token:
             break
+    return all_folders
 
-    dff = pd.DataFrame(all_folders)
+def _matches(folders, fcl):
+    fcl = (fcl or "").upper()
+    return [folder for folder in folders if fcl in folder['name'].upper()]
 
-    dff = dff[(dff["modifiedTime"] >= f"2025-08-01")]#{str(fecha_actual)}
-    #dff = dff[~dff["name"].str.contains("ABG|GAP|GMH", case=False, na=False)]
-    #dff = dff[dff["name"].str.contains("SEF064|SEF061|SEF062|SEF063|SEF065|SEF066|SEF067", case=False, na=False)]#GAP034
-    dff = dff[dff["name"].str.contains(fcl, case=False, na=False)]
-    
-    files_ = dff.to_dict(orient="records")
-    del dff
-    return files_
+def list_folders(service, folder_id, fcl="", modified_since=SEASON_START):
+    """
+    Carpetas FCL de la temporada cuyo nombre contiene `fcl`
+
+    La fecha de modificación se filtra en la consulta de Drive y el listado
+    de la temporada se cachea FOLDER_CACHE_TTL segundos. El nombre se busca
+    siempre como subcadena sobre ese listado: `name contains` de Drive solo
+    encuentra prefijos de palabras ("064" no encuentra "SEF064").
+
+    Args:
+        service: Servicio de Google Drive
+        folder_id (str): Carpeta raíz
+        fcl (str): Texto a buscar en el nombre de la carpeta
+        modified_since (str): Fecha mínima de modificación (RFC 3339)
+
+    Returns:
+        list: Carpetas con id, name, webViewLink y modifiedTime
+    """
+    key = (folder_id, modified_since)
+    with _folder_cache_lock:
+        folders = _folder_cache.get(key)
+    if folders is None:
+        folders = _query_folders(service, folder_id, modified_since)
+        with _folder_cache_lock:
+            _folder_cache[key] = folders
+    return _matches(folders, (fcl or "").strip())
+
+IMAGE_LIST_FIELDS = "id, name, mimeType, size, webViewLink, modifiedTime, md5Checksum"
+
+def iter_images_in_folder(service, folder_id, page_size=1000):
+    """
+    Recorrer las imágenes de una carpeta siguiendo `nextPageToken`
+
+    Cada página se pide cuando se consumió la anterior, así las descargas
+    pueden empezar antes de terminar el listado.
+
+    Yields:
+        dict: Archivo de imagen (IMAGE_LIST_FIELDS)
+    """
+    query = f"'{folder_id}' in parents and (mimeType contains 'image/') and trashed=false"
+    page_token = None
+    while True:
+        results = service.files().list(
+                q=query,
+                pageSize=page_size,
+                pageToken=page_token,
+                fields=f"nextPageToken, files({IMAGE_LIST_FIELDS})"
+        ).execute()
+        yield from results.get('files', [])
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            break
 
 def list_images_in_folder(service, folder_id):
-    """Listar todas las imágenes en la carpeta especificada"""
-    
-    query = f"'{folder_id}' in parents and (mimeType contains 'image/')"
-    results = service.files().list(
-            q=query,
-            pageSize=1000,
-            fields="nextPageToken, files(id, name, mimeType, size, webViewLink, modifiedTime)"
-    ).execute()
-        
-    files = results.get('files', [])
-    #dff = pd.DataFrame(files)
-    #st.dataframe(dff)
-    #dff = dff[dff["modifiedTime"] > "2025-08-25"]
-    #files_ = dff.to_dict(orient="records")
-    
-    return files
+    """Listar todas las imágenes en la carpeta especificada (todas las páginas)"""
+    return list(iter_images_in_folder(service, folder_id))
     
 def download_image(service, file_id):
 
@@ -107,115 +180,319 @@ def download_image(service, file_id):
     file.seek(0)
     return file
 
-def optimize_image(image_data, max_size=(1200, 1200), quality=90):
-    """Optimizar imagen manteniendo alta calidad visual"""
+_thread_local = threading.local()
+
+def get_thread_service():
+    """Servicio de Drive propio del hilo; el cliente de googleapiclient no es thread-safe"""
+    service = getattr(_thread_local, "service", None)
+    if service is None:
+        service = authenticate_google_drive()
+        _thread_local.service = service
+    return service
+
+def _error_reasons(error):
+    """Motivos (`reason`) del cuerpo JSON de un HttpError de Drive"""
+    try:
+        body = json.loads((error.content or b"").decode("utf-8"))
+    except (ValueError, UnicodeDecodeError):
+        return set()
+    details = body.get("error") if isinstance(body, dict) else None
+    if not isinstance(details, dict):
+        return set()
+    return {e.get("reason") for e in details.get("errors", []) if isinstance(e, dict)}
+
+def _is_retryable(error):
+    """Errores de cuota (403 rateLimitExceeded / 429), del servidor (5xx) o de transporte"""
+    if isinstance(error, HttpError):
+        status = error.resp.status
+        if status == 403:
+            return bool(_error_reasons(error) & RATE_LIMIT_REASONS)
+        return status == 429 or status >= 500
+    return isinstance(error, TRANSIENT_ERRORS)
+
+def download_image_with_retry(file_id, max_retries=DOWNLOAD_MAX_RETRIES):
+    """
+    Descargar una imagen con el servicio del hilo, con backoff exponencial
+
+    Returns:
+        io.BytesIO con la imagen, o None si no se pudo descargar
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return download_image(get_thread_service(), file_id)
+        except Exception as e:
+            if attempt == max_retries or not _is_retryable(e):
+                print(f"         ❌ Error al descargar {file_id}: {e}")
+                return None
+            delay = min(DOWNLOAD_BACKOFF_MAX, DOWNLOAD_BACKOFF_BASE * 2 ** attempt)
+            time.sleep(delay + random.uniform(0, delay / 2))
+
+def download_images(items, max_workers=DOWNLOAD_WORKERS, get_id=lambda item: item['id']):
+    """
+    Descargar imágenes en paralelo con un pool de hilos acotado
+
+    Los resultados se entregan a medida que terminan, para que el
+    procesamiento empiece sin esperar a todo el lote. Como mucho hay
+    PENDING_PER_WORKER × max_workers descargas sin consumir: si el consumidor
+    va más lento, no se encolan más y las imágenes no se acumulan en memoria.
+
+    Args:
+        items (iterable): Imágenes del listado (o tuplas que las contengan)
+        max_workers (int): Descargas simultáneas
+        get_id (callable): Obtiene el id de Drive de cada item
+
+    Yields:
+        (item, io.BytesIO | None)
+    """
+    max_pending = PENDING_PER_WORKER * max_workers
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="drive-download") as executor:
+        futures = {}
+        # `items` puede ser un generador de listado: se encola a medida que llega
+        for item in items:
+            futures[executor.submit(download_image_with_retry, get_id(item))] = item
+            done = [f for f in futures if f.done()]
+            if len(futures) >= max_pending and not done:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield futures.pop(future), future.result()
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+# Parámetros de optimización de imágenes
+JPEG_QUALITY = 85
+# Por encima de este tamaño la imagen se reduce a FALLBACK_MAX_SIDE
+MAX_IMAGE_BYTES = 150000
+FALLBACK_MAX_SIDE = 800
+MIN_TARGET_QUALITY = 60
+
+def _target_size(original_size):
+    """Tamaño máximo según el tamaño original (redimensionamiento conservador)"""
+    if original_size[0] > 2000 or original_size[1] > 2000:
+        # Imágenes muy grandes: redimensionar moderadamente
+        return (1200, 1200)
+    elif original_size[0] > 1500 or original_size[1] > 1500:
+        # Imágenes grandes: redimensionar ligeramente
+        return (1400, 1400)
+    elif original_size[0] > 1000 or original_size[1] > 1000:
+        # Imágenes medianas: redimensionar muy ligeramente
+        return (1000, 1000)
+    # Imágenes pequeñas: mantener tamaño original
+    return original_size
+
+def _encode_jpeg(img, quality, progressive=False):
+    output = io.BytesIO()
+    img.save(output, format='JPEG', quality=quality, optimize=True, progressive=progressive)
+    return output.getvalue()
+
+def _search_quality(img, target_bytes, max_quality, min_quality=MIN_TARGET_QUALITY):
+    """
+    Búsqueda binaria de la mayor calidad cuyo JPEG cabe en target_bytes
+
+    Returns:
+        (bytes JPEG, calidad, codificaciones realizadas)
+    """
+    best = None
+    encodes = 0
+    low, high = min_quality, max(max_quality, min_quality)
+    while low <= high:
+        mid = (low + high) // 2
+        data = _encode_jpeg(img, mid, progressive=True)
+        encodes += 1
+        if len(data) <= target_bytes:
+            best = (data, mid)
+            low = mid + 1
+        else:
+            high = mid - 1
+    if best is None:
+        # Ni la calidad mínima cabe: la última prueba fue con min_quality
+        best = (data, min_quality)
+    return best[0], best[1], encodes
+
+def optimize_image(image_data, quality=JPEG_QUALITY, max_bytes=MAX_IMAGE_BYTES, target_bytes=None):
+    """
+    Optimizar imagen manteniendo alta calidad visual
+
+    Los JPEG se decodifican ya reducidos con `draft()` y se codifican una
+    sola vez a calidad fija; solo si el resultado supera `max_bytes` se
+    reduce a FALLBACK_MAX_SIDE y se codifica una segunda vez. Con
+    `target_bytes` se busca además la mayor calidad que quepa en ese tamaño.
+
+    Args:
+        image_data: Buffer con la imagen original
+        quality (int): Calidad JPEG
+        max_bytes (int): Tamaño a partir del cual se reduce la imagen
+        target_bytes (int): Presupuesto de bytes opcional
+
+    Returns:
+        (bytes JPEG, dict con tamaño, calidad, progresivo y codificaciones),
+        o (None, None) si falla
+    """
     try:
         # Abrir imagen
         img = Image.open(image_data)
         original_size = img.size
+        target_size = _target_size(original_size)
+
+        # Decodificar el JPEG directamente a escala 1/2, 1/4 u 1/8 si alcanza
+        img.draft('RGB', target_size)
         
         # Convertir a RGB si es necesario
         if img.mode in ('RGBA', 'LA', 'P'):
             img = img.convert('RGB')
         
-        # Estrategia de redimensionamiento más conservadora
-        if original_size[0] > 2000 or original_size[1] > 2000:
-            # Imágenes muy grandes: redimensionar moderadamente
-            target_size = (1200, 1200)
-        elif original_size[0] > 1500 or original_size[1] > 1500:
-            # Imágenes grandes: redimensionar ligeramente
-            target_size = (1400, 1400)
-        elif original_size[0] > 1000 or original_size[1] > 1000:
-            # Imágenes medianas: redimensionar muy ligeramente
-            target_size = (1000, 1000)
-        else:
-            # Imágenes pequeñas: mantener tamaño original
-            target_size = original_size
-        
         # Redimensionar si es necesario
         if img.size[0] > target_size[0] or img.size[1] > target_size[1]:
             img.thumbnail(target_size, Image.Resampling.LANCZOS)
         
-        # Estrategia de compresión más conservadora
-        # Probar calidades más altas para mantener mejor calidad
-        best_output = None
-        best_size = float('inf')
-        target_quality = quality
-        
-        # Probar calidades desde 80 hasta 95 para mantener alta calidad
-        for test_quality in range(80, 96, 5):
-            output = io.BytesIO()
-            img.save(output, format='JPEG', quality=test_quality, optimize=True)
-            output.seek(0)
-            current_size = len(output.getvalue())
-            
-            # Si el tamaño es menor y la calidad es alta, actualizar
-            if current_size < best_size and test_quality >= 85:
-                best_size = current_size
-                best_output = output
-                target_quality = test_quality
-        
-        # Si no se encontró una buena opción, usar la calidad original
-        if best_output is None:
-            best_output = io.BytesIO()
-            img.save(best_output, format='JPEG', quality=quality, optimize=True)
-            best_output.seek(0)
-            target_quality = quality
-        
-        best_output.seek(0)
+        data = _encode_jpeg(img, quality)
+        params = {'size': img.size, 'quality': quality, 'progressive': False, 'encodes': 1}
+
+        limit = min(max_bytes, target_bytes) if target_bytes else max_bytes
+        if len(data) > limit:
+            # Reducir solo si es muy grande
+            if img.size[0] > FALLBACK_MAX_SIDE or img.size[1] > FALLBACK_MAX_SIDE:
+                img.thumbnail((FALLBACK_MAX_SIDE, FALLBACK_MAX_SIDE), Image.Resampling.LANCZOS)
+            data = _encode_jpeg(img, quality, progressive=True)
+            params.update(size=img.size, progressive=True, encodes=2)
+
+            if target_bytes and len(data) > target_bytes:
+                data, params['quality'], encodes = _search_quality(img, target_bytes, quality - 1)
+                params['encodes'] += encodes
         
         # Mostrar información de optimización
         original_bytes = len(image_data.getvalue()) if hasattr(image_data, 'getvalue') else 0
-        optimized_bytes = len(best_output.getvalue())
-        compression_ratio = (1 - optimized_bytes / original_bytes) * 100 if original_bytes > 0 else 0
+        compression_ratio = (1 - len(data) / original_bytes) * 100 if original_bytes > 0 else 0
         
-        print(f"         📊 Optimización: {original_size} → {img.size}, {target_quality}% calidad, {compression_ratio:.1f}% reducción")
+        print(
+            f"         📊 Optimización: {original_size} → {params['size']}, {params['quality']}% calidad, "
+            f"{params['encodes']} codificación(es), {len(data)/1024:.1f}KB ({compression_ratio:.1f}% reducción)"
+        )
         
-        return best_output
+        return data, params
     except Exception as e:
         print(f"Error al optimizar imagen: {e}")
-        return None
+        return None, None
+    
+def process_image(image_data, target_bytes=None):
+    """Optimizar imagen y retornar los bytes JPEG finales"""
+    image_bytes, _ = optimize_image(image_data, target_bytes=target_bytes)
+    return image_bytes
+
+def process_image_bytes(raw_bytes):
+    """process_image sobre bytes; función de módulo para poder enviarla al pool de procesos"""
+    return process_image(io.BytesIO(raw_bytes))
+
+_optimize_pool = None
+_optimize_pool_lock = threading.Lock()
+
+def get_optimize_pool(max_workers=OPTIMIZE_WORKERS):
+    """
+    Pool de procesos compartido para optimizar imágenes
+
+    Se usa forkserver porque el proceso de Streamlit tiene hilos vivos
+    (descargas, servidor) y un fork directo podría heredar locks tomados.
+    Donde no existe (Windows) se usa el método por defecto, que ahí es spawn.
+    """
+    global _optimize_pool
+    with _optimize_pool_lock:
+        if _optimize_pool is None:
+            _optimize_pool = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=_optimize_context(),
+            )
+        return _optimize_pool
 
-def apply_advanced_optimization(image_data):
-    """Aplicar optimización avanzada manteniendo alta calidad"""
+def _optimize_context():
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context()
+
+def _reset_optimize_pool(broken_pool):
+    """
+    Reemplazar el pool compartido si sigue siendo `broken_pool`
+
+    No se cancelan tareas: las de otras sesiones en el pool roto ya fallaron
+    con BrokenProcessPool, y el pool nuevo lo crea el próximo `get_optimize_pool`.
+    """
+    global _optimize_pool
+    with _optimize_pool_lock:
+        if _optimize_pool is broken_pool:
+            _optimize_pool = None
+    broken_pool.shutdown(wait=False)
+
+def _optimize_result(future, pool):
     try:
-        # Si la imagen es muy grande, aplicar compresión adicional
-        current_size = len(image_data.getvalue())
-        
-        if current_size > 150000:  # Más de 150KB (aumentado el umbral)
-            # Reabrir la imagen para optimización adicional
-            image_data.seek(0)
-            img = Image.open(image_data)
-            
-            # Reducir solo si es muy grande
-            if img.size[0] > 800 or img.size[1] > 800:
-                new_size = (min(800, img.size[0]), min(800, img.size[1]))
-                img.thumbnail(new_size, Image.Resampling.LANCZOS)
-            
-            # Aplicar compresión con calidad más alta
-            output = io.BytesIO()
-            img.save(output, format='JPEG', quality=85, optimize=True, progressive=True)
-            output.seek(0)
-            
-            print(f"         🔧 Optimización avanzada aplicada: {current_size/1024:.1f}KB → {len(output.getvalue())/1024:.1f}KB")
-            return output
-        
-        return image_data
+        return future.result()
+    except BrokenProcessPool as e:
+        print(f"         ❌ Pool de optimización caído, se recreará: {e}")
+        _reset_optimize_pool(pool)
     except Exception as e:
-        print(f"Error en optimización avanzada: {e}")
-        return image_data
-    
+        print(f"         ❌ Error al procesar imagen: {e}")
+    return None
+
+def _submit_optimize(image_data, max_workers):
+    """Enviar una imagen al pool compartido; None si el pool no acepta tareas"""
+    pool = get_optimize_pool(max_workers)
+    try:
+        return pool.submit(process_image_bytes, image_data.getvalue()), pool
+    except (BrokenProcessPool, RuntimeError) as e:
+        # Pool roto o cerrado por otra sesión: se reemplaza y se reintenta una vez
+        print(f"         ⚠️ Pool de optimización no disponible, se recreará: {e}")
+        _reset_optimize_pool(pool)
+    pool = get_optimize_pool(max_workers)
+    try:
+        return pool.submit(process_image_bytes, image_data.getvalue()), pool
+    except (BrokenProcessPool, RuntimeError) as e:
+        print(f"         ❌ Error al enviar imagen al pool de optimización: {e}")
+        return None, None
+
+def optimize_images(downloads, max_workers=OPTIMIZE_WORKERS):
+    """
+    Optimizar en el pool de procesos las imágenes que entrega `download_images`
+
+    Cada imagen se envía al pool en cuanto llega, así la descarga (hilos) y
+    la optimización (procesos) avanzan en paralelo. Como mucho hay
+    PENDING_PER_WORKER × max_workers imágenes en el pool; al llegar a ese
+    límite se espera a que termine alguna antes de enviar más.
+
+    Args:
+        downloads: Iterable de (item, io.BytesIO | None)
+        max_workers (int): Procesos del pool
+
+    Yields:
+        (item, bytes JPEG | None) a medida que terminan
+    """
+    max_pending = PENDING_PER_WORKER * max_workers
+    # future -> (item, pool al que se envió)
+    pending = {}
+    for item, image_data in downloads:
+        if image_data is None:
+            yield item, None
+            continue
+        # El pool se vuelve a pedir en cada envío por si se reemplazó tras caerse
+        future, pool = _submit_optimize(image_data, max_workers)
+        if future is None:
+            yield item, None
+            continue
+        pending[future] = (item, pool)
+
+        done = [f for f in pending if f.done()]
+        if len(pending) >= max_pending and not done:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            item, pool = pending.pop(future)
+            yield item, _optimize_result(future, pool)
+    for future in as_completed(pending):
+        item, pool = pending[future]
+        yield item, _optimize_result(future, pool)
+
 def image_to_base64(image_data):
     """Convertir imagen a base64 con optimización máxima"""
     try:
-        # Optimizar imagen
-        optimized_image = optimize_image(image_data)
-        if optimized_image:
-            # Aplicar optimización adicional si la imagen es muy grande
-            final_image = apply_advanced_optimization(optimized_image)
-            
+        image_bytes = process_image(image_data)
+        if image_bytes:
             # Convertir a base64
-            base64_string = base64.b64encode(final_image.getvalue()).decode('utf-8')
+            base64_string = base64.b64encode(image_bytes).decode('utf-8')
             return f"data:image/jpeg;base64,{base64_string}"
         return None
     except Exception as e:
@@ -275,32 +552,15 @@ def extract_all_data():
         
         print(f"   ✅ Se encontraron {len(images)} imágenes")
         
-        # Procesar cada imagen como una fila separada
-        for j, image in enumerate(images, 1):
+        # Procesar cada imagen como una fila separada: descarga en hilos, optimización en procesos
+        for j, (image, image_bytes) in enumerate(optimize_images(download_images(images)), 1):
             original_size_mb = int(image.get('size', 0)) / (1024 * 1024)
             print(f"      🖼️  Procesando imagen {j}/{len(images)}: {image['name']} ({original_size_mb:.2f}MB)")
             
-            # Descargar imagen
-            image_data = download_image(service, image['id'])
-            if not image_data:
-                print(f"         ❌ Error al descargar {image['name']}")
-                # Agregar fila con error
-                all_data.append({
-                    'folder_id': folder['id'],
-                    'folder_name': folder['name'],
-                    'folder_webViewLink': folder['webViewLink'],
-                    'folder_modifiedTime': folder.get('modifiedTime'),
-                    'image_id': image['id'],
-                    'image_name': image['name'],
-                    'image_webViewLink': image.get('webViewLink'),
-                    'image_modifiedTime': image.get('modifiedTime'),
-                    'image_base64': None,
-                    'image_size_mb': original_size_mb
-                })
-                continue
-            
             # Convertir a base64
-            base64_image = image_to_base64(image_data)
+            base64_image = None
+            if image_bytes:
+                base64_image = f"data:image/jpeg;base64,{base64.b64encode(image_bytes).decode('utf-8')}"
             if base64_image:
                 # Calcular tamaño optimizado
                 optimized_size_mb = len(base64_image) * 0.75 / (1024 * 1024)
@@ -1,47 +1,178 @@
-import requests
+import threading
+import time
 from typing import Optional
 from utils.config import load_config
-from utils.config import load_config
+from utils.graph_client import get_session
 config = load_config()
 
+LOGIN_AUTHORITY = "https://login.microsoftonline.com"
+GRAPH_SCOPE = "https://graph.microsoft.com/.default"
+# Segundos antes de `expires_in` en los que se renueva el token en segundo plano
+TOKEN_REFRESH_MARGIN = 300
+# Fracción máxima de `expires_in` usada como margen, para tokens de vida corta
+TOKEN_REFRESH_FRACTION = 0.5
+# Tiempo máximo que una llamada espera a que otra termine de renovar el token
+TOKEN_WAIT_TIMEOUT = 30
+# Pausa antes de reintentar una renovación de fondo fallida
+TOKEN_RETRY_DELAY = 30
 
 
+class TokenCache:
+    """
+    Cache de tokens de Microsoft Graph compartido por todo el proceso.
 
-def get_access_token() -> Optional[str]:
+    Los tokens se guardan por (tenant_id, client_id) y se reutilizan hasta
+    `TOKEN_REFRESH_MARGIN` segundos antes de expirar (como mucho la mitad de
+    su vida). Dentro de ese margen se
+    devuelve el token vigente y se renueva en un hilo de fondo; si el token
+    ya expiró, la primera llamada lo solicita y las concurrentes esperan su
+    resultado en lugar de hacer su propio POST.
     """
-    Obtiene el token de acceso para Microsoft Graph API
+
+    def __init__(self, refresh_margin=TOKEN_REFRESH_MARGIN, wait_timeout=TOKEN_WAIT_TIMEOUT):
+        self.refresh_margin = refresh_margin
+        self.wait_timeout = wait_timeout
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._inflight = {}
+
+    @staticmethod
+    def _key(credentials):
+        return (credentials['tenant_id'], credentials['client_id'])
+
+    def get_token(self, credentials) -> Optional[str]:
+        """
+        Obtener un token válido para las credenciales indicadas
+
+        Args:
+            credentials (dict): Sección de configuración con tenant_id, client_id,
+                client_secret y opcionalmente authority (URL base del endpoint)
+
+        Returns:
+            str: Token de acceso, o None si no se pudo obtener
+        """
+        key = self._key(credentials)
+        with self._lock:
+            entry = self._entries.get(key)
+            now = time.monotonic()
+            if entry and now < entry["expires_at"]:
+                if (now >= entry["refresh_at"]
+                        and now >= entry.get("retry_after", 0)
+                        and key not in self._inflight):
+                    # Token aún válido pero cerca de expirar: renovar en segundo plano
+                    self._inflight[key] = threading.Event()
+                    threading.Thread(
+                        target=self._refresh, args=(key, credentials), daemon=True
+                    ).start()
+                return entry["token"]
+
+            event = self._inflight.get(key)
+            leader = event is None
+            if leader:
+                event = threading.Event()
+                self._inflight[key] = event
+
+        if leader:
+            self._refresh(key, credentials)
+        else:
+            event.wait(self.wait_timeout)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and time.monotonic() < entry["expires_at"]:
+                return entry["token"]
+            return None
+
+    def invalidate(self, credentials):
+        """Descartar el token guardado (p. ej. tras un 401)"""
+        with self._lock:
+            self._entries.pop(self._key(credentials), None)
+
+    def clear(self):
+        """Vaciar el cache completo"""
+        with self._lock:
+            self._entries.clear()
+
+    def _refresh(self, key, credentials):
+        try:
+            result = request_token(credentials)
+            if result:
+                access_token, expires_in = result
+                # Con un margen mayor que la vida del token cada llamada lanzaría una renovación
+                margin = min(self.refresh_margin, expires_in * TOKEN_REFRESH_FRACTION)
+                now = time.monotonic()
+                with self._lock:
+                    self._entries[key] = {
+                        "token": access_token,
+                        "expires_at": now + expires_in,
+                        "refresh_at": now + expires_in - margin,
+                    }
+            else:
+                with self._lock:
+                    if key in self._entries:
+                        # Esperar antes de reintentar la renovación en segundo plano
+                        self._entries[key]["retry_after"] = time.monotonic() + TOKEN_RETRY_DELAY
+        finally:
+            with self._lock:
+                event = self._inflight.pop(key, None)
+            if event:
+                event.set()
+
+
+def request_token(credentials):
     """
-    if not config:
-        print("Error: No se pudo cargar la configuración")
-        return None
-    
-    AUTHORITY = f"https://login.microsoftonline.com/{config['microsoft_graph']['tenant_id']}/oauth2/v2.0/token"
+    Solicitar un token nuevo al endpoint OAuth2 (client credentials)
+
+    Args:
+        credentials (dict): tenant_id, client_id, client_secret y opcionalmente
+            authority para apuntar a otro endpoint (p. ej. un stub local)
+
+    Returns:
+        tuple: (access_token, expires_in) o None si hubo error
+    """
+    authority = credentials.get('authority', LOGIN_AUTHORITY).rstrip('/')
+    AUTHORITY = f"{authority}/{credentials['tenant_id']}/oauth2/v2.0/token"
     try:
-        response = requests.post(AUTHORITY, data={
+        response = get_session().post(AUTHORITY, data={
             "grant_type": "client_credentials",
-            "client_id": config['microsoft_graph']['client_id'],
-            "client_secret": config['microsoft_graph']['client_secret'],
-            "scope": "https://graph.microsoft.com/.default"
+            "client_id": credentials['client_id'],
+            "client_secret": credentials['client_secret'],
+            "scope": GRAPH_SCOPE
         })
-        
+
         if response.status_code == 200:
             token_response = response.json()
             access_token = token_response.get("access_token")
-            
+
             if access_token:
                 print("Token de acceso obtenido exitosamente")
-                return access_token
+                return access_token, int(token_response.get("expires_in", 3599))
             else:
                 print("Error: No se pudo obtener el token de acceso")
                 return None
         else:
             print(f"Error HTTP {response.status_code}: {response.text}")
             return None
-            
+
     except Exception as e:
         print(f"Error al obtener el token: {e}")
         return None
 
+
+# Instancia global del cache de tokens
+token_cache = TokenCache()
+
+
+def get_access_token() -> Optional[str]:
+    """
+    Obtiene el token de acceso para Microsoft Graph API
+    """
+    if not config:
+        print("Error: No se pudo cargar la configuración")
+        return None
+
+    return token_cache.get_token(config['microsoft_graph'])
+
 def get_access_token_alza() -> Optional[str]:
     """
     Obtiene el token de acceso para Microsoft Graph API
@@ -49,30 +180,5 @@ def get_access_token_alza() -> Optional[str]:
     if not config:
         print("Error: No se pudo cargar la configuración")
         return None
-    
-    AUTHORITY = f"https://login.microsoftonline.com/{config['microsoft_graph_alza']['tenant_id']}/oauth2/v2.0/token"
-    try:
-        response = requests.post(AUTHORITY, data={
-            "grant_type": "client_credentials",
-            "client_id": config['microsoft_graph_alza']['client_id'],
-            "client_secret": config['microsoft_graph_alza']['client_secret'],
-            "scope": "https://graph.microsoft.com/.default"
-        })
-        
-        if response.status_code == 200:
-            token_response = response.json()
-            access_token = token_response.get("access_token")
-            
-            if access_token:
-                print("Token de acceso obtenido exitosamente")
-                return access_token
-            else:
-                print("Error: No se pudo obtener el token de acceso")
-                return None
-        else:
-            print(f"Error HTTP {response.status_code}: {response.text}")
-            return None
-            
-    except Exception as e:
-        print(f"Error al obtener el token: {e}")
-        return None
\ No newline at end of file
+
+    return token_cache.get_token(config['microsoft_graph_alza'])
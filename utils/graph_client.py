@@ -0,0 +1,117 @@
+"""
+Cliente HTTP compartido para Microsoft Graph / OneDrive
+
+Una sola sesión de requests por proceso con pool de conexiones keep-alive,
+reintentos acotados con backoff en 429/5xx (respetando Retry-After) y
+timeout por defecto en cada petición.
+"""
+
+import io
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# (connect, read) en segundos
+DEFAULT_TIMEOUT = (5, 60)
+DOWNLOAD_TIMEOUT = (5, 300)
+POOL_CONNECTIONS = 10
+POOL_MAXSIZE = 32
+MAX_RETRIES = 4
+BACKOFF_FACTOR = 0.5
+# Tope para no bloquear una ejecución del script si Graph pide esperar demasiado
+MAX_RETRY_AFTER = 30
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class CappedRetry(Retry):
+    """Retry que respeta Retry-After pero sin superar MAX_RETRY_AFTER segundos"""
+
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        if retry_after is None:
+            return None
+        return min(retry_after, MAX_RETRY_AFTER)
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter que aplica un timeout por defecto si la petición no trae uno"""
+
+    def __init__(self, *args, timeout=DEFAULT_TIMEOUT, **kwargs):
+        self.timeout = timeout
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        return super().send(request, **kwargs)
+
+
+def create_session():
+    """Crear una sesión con pool de conexiones, reintentos y timeout"""
+    retry = CappedRetry(
+        total=MAX_RETRIES,
+        backoff_factor=BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUS_CODES,
+        allowed_methods=frozenset({"GET", "HEAD", "POST"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = TimeoutHTTPAdapter(
+        pool_connections=POOL_CONNECTIONS,
+        pool_maxsize=POOL_MAXSIZE,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Sesión compartida por todo el proceso"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = create_session()
+    return _session
+
+
+def graph_get(url, access_token, params=None, timeout=None):
+    """
+    GET autenticado contra Microsoft Graph
+
+    Args:
+        url (str): URL completa del recurso
+        access_token (str): Token Bearer
+        params (dict): Parámetros de query opcionales
+        timeout: Timeout (connect, read); por defecto DEFAULT_TIMEOUT
+
+    Returns:
+        requests.Response
+    """
+    headers = {
+        "Authorization": f"Bearer {access_token}"
+    }
+    return get_session().get(url, headers=headers, params=params, timeout=timeout)
+
+
+def download_file(url, timeout=DOWNLOAD_TIMEOUT):
+    """
+    Descargar un archivo (p. ej. @microsoft.graph.downloadUrl) reutilizando el pool
+
+    Args:
+        url (str): URL de descarga pre-autenticada
+        timeout: Timeout (connect, read)
+
+    Returns:
+        io.BytesIO con el contenido del archivo
+    """
+    response = get_session().get(url, timeout=timeout)
+    response.raise_for_status()
+    return io.BytesIO(response.content)
@@ -1,11 +1,17 @@
 import psycopg2
+import threading
 import streamlit as st
+from contextlib import contextmanager
 from psycopg2.extras import RealDictCursor
 import sqlalchemy
 from sqlalchemy import create_engine, text
 import io
 import pandas as pd
+from cachetools import TTLCache
 from utils.config import load_config
+from utils.db_pool import ConnectionPool, POOL_MIN_SIZE, POOL_MAX_SIZE, MAX_USES
+from utils.db_migrations import apply_migrations, fcl_key
+from utils.image_db import fetch_images, count_images, iter_images, get_image, STREAM_ITERSIZE
 
 config = load_config()
 # Configuración de la base de datos PostgreSQL
@@ -26,68 +32,116 @@ def create_database_connection():
         print(f"Error al conectar con la base de datos: {e}")
         return None
 
+_db_pool = None
+_db_pool_lock = threading.Lock()
 
-@st.cache_data(show_spinner="Cargando imagenes...", ttl=60)
-def get_img_evacalidad_data(fcl = None):
-    """Obtener datos de la tabla para verificación"""
-    connection = create_database_connection()
-    if not connection:
-        return None
-    
+def get_db_pool():
+    """Pool de conexiones del proceso, creado en el primer uso"""
+    global _db_pool
+    if _db_pool is None:
+        with _db_pool_lock:
+            if _db_pool is None:
+                _db_pool = ConnectionPool(
+                    DB_CONFIG,
+                    min_size=config['db'].get('pool_min_size', POOL_MIN_SIZE),
+                    max_size=config['db'].get('pool_max_size', POOL_MAX_SIZE),
+                    max_uses=config['db'].get('pool_max_uses', MAX_USES),
+                )
+                # Las migraciones son un paso del despliegue (deploy.sh); auto_migrate
+                # las aplica además desde la app, en segundo plano
+                if config['db'].get('auto_migrate', False):
+                    threading.Thread(target=_bootstrap_schema, args=(_db_pool,), daemon=True).start()
+    return _db_pool
+
+def _bootstrap_schema(pool):
+    """Aplicar las migraciones pendientes sin esperar a otro proceso; un fallo no impide consultar"""
     try:
-        cursor = connection.cursor(cursor_factory=RealDictCursor)
-        cursor.execute("""SELECT 
-                            TRIM(folder_name) AS fcl,
-                            image_base64 AS imagen
-                        FROM images_fcl_drive 
-                        where TRIM(folder_name) = %s
-                        """, (fcl,)
-        )
-        data = cursor.fetchall()
-        cursor.close()
-        connection.close()
-        
-        if data:
-            df = pd.DataFrame(data)
-            return df
+        with pool.connection() as connection:
+            apply_migrations(connection, wait=False)
+    except Exception as e:
+        print(f"⚠️ No se pudieron aplicar las migraciones: {e}")
+
+@contextmanager
+def get_connection():
+    """Conexión del pool; se devuelve al pool al salir del bloque"""
+    with get_db_pool().connection() as connection:
+        yield connection
+
+
+def iter_img_evacalidad(fcl, itersize=STREAM_ITERSIZE, with_ids=False):
+    """
+    Imágenes (bytes) de un FCL una a una, leídas con un cursor de servidor
+
+    La conexión del pool queda tomada mientras se itera y se devuelve al
+    terminar o al descartar el generador. No se cachea: está pensado para
+    recorrer un FCL pesado sin tener todas sus imágenes en memoria.
+
+    Con `with_ids` se entregan tuplas (image_id, ctid heredado o None, bytes);
+    el id y el ctid sirven para volver a pedir esa imagen con
+    get_img_evacalidad_image.
+    """
+    with get_connection() as connection:
+        for image_id, ctid, _, image in iter_images(connection, 'fcl_drive', fcl, itersize):
+            yield (image_id, ctid, image) if with_ids else image
+
+def get_img_evacalidad_image(fcl, image_id, legacy_ctid=None):
+    """Imagen (bytes) de un FCL por su image_id; lee una sola fila, migrada o heredada"""
+    with get_connection() as connection:
+        return get_image(connection, 'fcl_drive', fcl, image_id, legacy_ctid)
+
+# Imágenes de despacho por FCL; se invalidan con invalidate_img_despacho_cache
+IMG_DESPACHO_CACHE_TTL = 600
+IMG_DESPACHO_CACHE_SIZE = 64
+_img_despacho_cache = TTLCache(maxsize=IMG_DESPACHO_CACHE_SIZE, ttl=IMG_DESPACHO_CACHE_TTL)
+_img_despacho_cache_lock = threading.Lock()
+
+def invalidate_img_despacho_cache(fcl=None):
+    """Descartar las imágenes cacheadas de un FCL, o de todos si no se indica"""
+    with _img_despacho_cache_lock:
+        if fcl is None:
+            _img_despacho_cache.clear()
         else:
-            return pd.DataFrame()
-            
+            _img_despacho_cache.pop(fcl_key(fcl), None)
+
+def _query_img_despacho(fcl):
+    with get_connection() as connection:
+        df = fetch_images(connection, 'despacho', [fcl])
+    return df.rename(columns={'folder_key': 'name', 'image': 'imagen'})[['name', 'image_id', 'imagen']]
+
+@st.cache_data(ttl=60)
+def get_img_despacho_counts(fcls):
+    """
+    Cantidad de imágenes de varios despachos, sin leer las imágenes
+
+    Args:
+        fcls (tuple): Números de FCL
+
+    Returns:
+        dict: {fcl: cantidad}, o None si falla la consulta
+    """
+    try:
+        with get_connection() as connection:
+            return count_images(connection, 'despacho', fcls)
     except Exception as e:
         st.error(f"Error al obtener datos: {e}")
-        if connection:
-            connection.close()
         return None
 
-#@st.cache_data(show_spinner="Cargando imagenes...")
 def get_img_despacho_data(fcl = None):
-    """Obtener datos de la tabla para verificación"""
-    connection = create_database_connection()
-    if not connection:
-        return None
-    
+    """
+    Imágenes de un despacho, cacheadas por FCL normalizado
+
+    Returns:
+        pandas.DataFrame con name, image_id e imagen (bytes), o None si falla la consulta
+    """
+    key = fcl_key(fcl)
+    with _img_despacho_cache_lock:
+        if key in _img_despacho_cache:
+            return _img_despacho_cache[key]
     try:
-        cursor = connection.cursor(cursor_factory=RealDictCursor)
-        cursor.execute("""
-                    SELECT 
-                        name, image_base64
-                    FROM images_onedrive_despacho
-                    WHERE name = %s
-                    
-                """, (f"{fcl}",)
-        )
-        data = cursor.fetchall()
-        cursor.close()
-        connection.close()
-        
-        if data:
-            df = pd.DataFrame(data)
-            return df
-        else:
-            return pd.DataFrame()
-            
+        df = _query_img_despacho(key)
     except Exception as e:
         st.error(f"Error al obtener datos: {e}")
-        if connection:
-            connection.close()
-        return None
\ No newline at end of file
+        return None
+    with _img_despacho_cache_lock:
+        _img_despacho_cache[key] = df
+    return df
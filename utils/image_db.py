@@ -0,0 +1,377 @@
+"""
+Imágenes en PostgreSQL: blobs binarios y metadatos separados
+
+Las tablas heredadas (images_fcl_drive, images_onedrive_despacho) guardan la
+imagen en base64 dentro de la misma fila que sus datos, así que cualquier
+consulta arrastra (y descomprime) el blob. Aquí las imágenes se guardan como
+bytea en `image_blobs`, direccionadas por su SHA-256, y `image_metadata`
+guarda solo carpeta, nombre, tamaño y dimensiones.
+
+Período de doble almacenamiento: el proceso de carga externo sigue
+escribiendo solo la tabla heredada, así que cada imagen está en las dos
+tablas y las nuevas son una copia que se mantiene al día con este módulo
+(servicio `image-sync` de docker-compose y paso de deploy.sh). Al migrar un
+FCL se registra en `image_migrations` cuántas filas heredadas tenía; las
+lecturas hacen por FCL un COUNT indexado sobre la tabla heredada (sin leer el
+base64) y usan image_metadata solo si coincide. Si no (FCL sin migrar, o con
+imágenes cargadas después de la última sincronización) leen la tabla
+heredada hasta la próxima. Cuando el proceso de carga escriba con
+`put_images`, el COUNT y la tabla heredada se pueden retirar. Las tablas
+nuevas las crea utils.db_migrations.
+
+Uso:
+    python -m utils.image_db fcl_drive despacho                 # sincronizar una vez
+    python -m utils.image_db fcl_drive despacho --interval 300  # sincronizar cada 5 minutos
+"""
+
+import sys
+import time
+import uuid
+import hashlib
+import argparse
+import psycopg2
+import pandas as pd
+from psycopg2.extras import execute_values
+from utils.db_migrations import FCL_KEY_EXPR, DESPACHO_KEY_EXPR, fcl_key
+from utils.image_store import image_dimensions, decode_base64_image
+
+# Tabla heredada de cada origen y expresión indexada con la que se busca el FCL;
+# es la misma al migrar y al leer, y coincide con fcl_key
+SOURCES = {
+    'fcl_drive': {'table': 'images_fcl_drive', 'key': FCL_KEY_EXPR},
+    'despacho': {'table': 'images_onedrive_despacho', 'key': DESPACHO_KEY_EXPR},
+}
+# Filas que trae el cursor de servidor por viaje; 1 = una sola imagen en memoria
+STREAM_ITERSIZE = 1
+
+
+def _legacy(source):
+    if source not in SOURCES:
+        raise ValueError(f"Origen de imágenes desconocido: {source}")
+    return SOURCES[source]
+
+
+def image_id(image_bytes):
+    """Identificador estable de una imagen: el SHA-256 de su contenido, igual antes y después de migrarla"""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def _keys(fcls):
+    return list(dict.fromkeys(fcl_key(fcl) for fcl in fcls))
+
+
+def _legacy_keys(cursor, source, keys):
+    """
+    FCL de `keys` que se deben leer de la tabla heredada
+
+    Son los que tienen en ella una cantidad de filas distinta de la registrada
+    al migrarlos: sin migrar, o con imágenes agregadas o borradas después. El
+    conteo usa el índice de la clave y no lee el base64.
+    """
+    legacy = _legacy(source)
+    cursor.execute(f"""
+        SELECT k.key FROM unnest(%s::text[]) AS k(key)
+        LEFT JOIN image_migrations g ON g.source = %s AND g.folder_key = k.key
+        WHERE COALESCE(g.legacy_rows, 0) <> (
+            SELECT COUNT(*) FROM {legacy['table']} t
+            WHERE {legacy['key']} = k.key AND t.image_base64 IS NOT NULL
+        )
+    """, (keys, source))
+    stale = {row[0] for row in cursor.fetchall()}
+    return [key for key in keys if key in stale]
+
+
+def count_images(connection, source, fcls):
+    """
+    Cantidad de imágenes por FCL sin leer ningún blob
+
+    Además de image_metadata, consulta el COUNT indexado de la tabla heredada
+    con que se decide si cada FCL está sincronizado (ver `_legacy_keys`).
+
+    Returns:
+        dict: {fcl normalizado: cantidad}; los FCL sin imágenes valen 0
+    """
+    legacy = _legacy(source)
+    keys = _keys(fcls)
+    counts = dict.fromkeys(keys, 0)
+    with connection.cursor() as cursor:
+        pending = _legacy_keys(cursor, source, keys)
+        cursor.execute("""
+            SELECT folder_key, COUNT(*) FROM image_metadata
+            WHERE source = %s AND folder_key = ANY(%s)
+            GROUP BY folder_key
+        """, (source, [key for key in keys if key not in pending]))
+        counts.update(dict(cursor.fetchall()))
+
+        if pending:
+            cursor.execute(f"""
+                SELECT {legacy['key']}, COUNT(*) FROM {legacy['table']}
+                WHERE {legacy['key']} = ANY(%s) AND image_base64 IS NOT NULL
+                GROUP BY 1
+            """, (pending,))
+            counts.update(dict(cursor.fetchall()))
+    return counts
+
+
+def _decode_legacy(value):
+    try:
+        return decode_base64_image(value)
+    except Exception as e:
+        print(f"⚠️ Imagen base64 inválida: {e}")
+        return None
+
+
+def fetch_images(connection, source, fcls):
+    """
+    Imágenes de varios FCL como bytes
+
+    Las imágenes de cada FCL vienen siempre en el mismo orden (el de
+    iter_images) y con su image_id.
+
+    Returns:
+        pandas.DataFrame con folder_key, image_id, image_name e image (bytes)
+    """
+    legacy = _legacy(source)
+    keys = _keys(fcls)
+    with connection.cursor() as cursor:
+        pending = _legacy_keys(cursor, source, keys)
+        cursor.execute("""
+            SELECT m.folder_key, m.hash, m.image_name, b.data
+            FROM image_metadata m
+            JOIN image_blobs b ON b.hash = m.hash
+            WHERE m.source = %s AND m.folder_key = ANY(%s)
+            ORDER BY m.folder_key, m.id
+        """, (source, [key for key in keys if key not in pending]))
+        rows = [(key, digest, name, bytes(data)) for key, digest, name, data in cursor.fetchall()]
+
+        if pending:
+            cursor.execute(f"""
+                SELECT {legacy['key']}, image_base64 FROM {legacy['table']}
+                WHERE {legacy['key']} = ANY(%s) AND image_base64 IS NOT NULL
+                ORDER BY 1, ctid
+            """, (pending,))
+            for key, image_base64 in cursor.fetchall():
+                image = _decode_legacy(image_base64)
+                if image is not None:
+                    rows.append((fcl_key(key), image_id(image), None, image))
+    return pd.DataFrame(rows, columns=['folder_key', 'image_id', 'image_name', 'image'])
+
+
+def iter_images(connection, source, fcl, itersize=STREAM_ITERSIZE):
+    """
+    Imágenes de un FCL una a una, con un cursor de servidor
+
+    A diferencia de `fetch_images`, no se materializa el resultado: el cursor
+    trae `itersize` filas por viaje y cada imagen se entrega antes de leer la
+    siguiente. La conexión debe estar en una transacción (no autocommit)
+    mientras se itera.
+
+    Yields:
+        (image_id, ctid de la fila heredada o None, nombre de imagen o None, bytes)
+    """
+    legacy = _legacy(source)
+    key = fcl_key(fcl)
+    with connection.cursor() as cursor:
+        migrated = not _legacy_keys(cursor, source, [key])
+
+    with connection.cursor(name=f"stream_{source}_{uuid.uuid4().hex}") as cursor:
+        cursor.itersize = itersize
+        if migrated:
+            cursor.execute("""
+                SELECT m.hash, m.image_name, b.data
+                FROM image_metadata m
+                JOIN image_blobs b ON b.hash = m.hash
+                WHERE m.source = %s AND m.folder_key = %s
+                ORDER BY m.id
+            """, (source, key))
+            for digest, image_name, data in cursor:
+                yield digest, None, image_name, bytes(data)
+        else:
+            cursor.execute(f"""
+                SELECT ctid, image_base64 FROM {legacy['table']}
+                WHERE {legacy['key']} = %s AND image_base64 IS NOT NULL
+                ORDER BY ctid
+            """, (key,))
+            for ctid, image_base64 in cursor:
+                image = _decode_legacy(image_base64)
+                if image is not None:
+                    yield image_id(image), ctid, None, image
+
+
+def get_image(connection, source, fcl, wanted_id, legacy_ctid=None):
+    """
+    Una imagen de un FCL por su image_id
+
+    Si el blob ya está en image_blobs se lee solo ese. Si no (FCL sin migrar)
+    se lee la fila heredada `legacy_ctid` que entregó `iter_images`, y solo si
+    ya no contiene esa imagen (la fila se movió, p. ej. tras un VACUUM FULL)
+    se recorre la tabla heredada del FCL hasta encontrarla.
+
+    Returns:
+        bytes, o None si el FCL no tiene esa imagen
+    """
+    legacy = _legacy(source)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT data FROM image_blobs WHERE hash = %s", (wanted_id,))
+        row = cursor.fetchone()
+        if row is not None:
+            return bytes(row[0])
+
+        if legacy_ctid is not None:
+            cursor.execute(f"""
+                SELECT image_base64 FROM {legacy['table']}
+                WHERE ctid = %s::tid AND {legacy['key']} = %s
+            """, (legacy_ctid, fcl_key(fcl)))
+            row = cursor.fetchone()
+            image = _decode_legacy(row[0]) if row and row[0] is not None else None
+            if image is not None and image_id(image) == wanted_id:
+                return image
+
+    images = iter_images(connection, source, fcl)
+    try:
+        return next((image for digest, _, _, image in images if digest == wanted_id), None)
+    finally:
+        images.close()
+
+
+def put_images(connection, source, images):
+    """
+    Guardar imágenes; un blob ya guardado no se vuelve a escribir
+
+    Cada tupla es una fila de image_metadata, aunque repita una imagen del
+    mismo FCL. No reemplaza filas anteriores: para volver a escribir un FCL
+    el llamador borra antes las suyas (ver `migrate_legacy_images`).
+
+    Args:
+        connection: Conexión psycopg2 (el llamador confirma la transacción)
+        source (str): Clave de SOURCES
+        images (iterable): Tuplas (fcl, nombre de imagen o None, bytes)
+
+    Returns:
+        int: Imágenes registradas en image_metadata
+    """
+    _legacy(source)
+    blobs = {}
+    metadata = []
+    for fcl, image_name, image_bytes in images:
+        digest = image_id(image_bytes)
+        width, height = image_dimensions(image_bytes)
+        blobs[digest] = image_bytes
+        metadata.append((source, fcl_key(fcl), image_name, digest, len(image_bytes), width, height))
+    if not metadata:
+        return 0
+
+    with connection.cursor() as cursor:
+        # Los blobs que ya existen no se vuelven a enviar al servidor
+        cursor.execute("SELECT hash FROM image_blobs WHERE hash = ANY(%s)", (list(blobs),))
+        for (digest,) in cursor.fetchall():
+            blobs.pop(digest, None)
+        if blobs:
+            execute_values(cursor, """
+                INSERT INTO image_blobs (hash, data) VALUES %s
+                ON CONFLICT (hash) DO NOTHING
+            """, [(digest, psycopg2.Binary(data)) for digest, data in blobs.items()])
+        # En una sola página para que rowcount cuente todas las filas
+        execute_values(cursor, """
+            INSERT INTO image_metadata (source, folder_key, image_name, hash, size_bytes, width, height)
+            VALUES %s
+        """, metadata, page_size=len(metadata))
+        return cursor.rowcount
+
+
+def migrate_legacy_images(connection, source):
+    """
+    Copiar a las tablas nuevas los FCL de la tabla heredada que falten
+
+    Se migran los FCL nuevos y los que cambiaron en la tabla heredada desde su
+    última migración; estos se reemplazan completos. Cada FCL se migra y
+    confirma en su propia transacción junto con su registro en
+    image_migrations: las lecturas nunca ven un FCL a medias y la migración se
+    puede interrumpir y retomar.
+
+    Returns:
+        int: Imágenes migradas
+    """
+    legacy = _legacy(source)
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT l.key FROM (
+                SELECT {legacy['key']} AS key, COUNT(*) AS legacy_rows
+                FROM {legacy['table']}
+                WHERE image_base64 IS NOT NULL
+                GROUP BY 1
+            ) l
+            LEFT JOIN image_migrations g ON g.source = %s AND g.folder_key = l.key
+            WHERE g.legacy_rows IS DISTINCT FROM l.legacy_rows
+        """, (source,))
+        keys = [row[0] for row in cursor.fetchall()]
+    connection.commit()
+
+    migrated = 0
+    for i, key in enumerate(keys, 1):
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT image_base64 FROM {legacy['table']}
+                WHERE {legacy['key']} = %s AND image_base64 IS NOT NULL
+                ORDER BY ctid
+            """, (key,))
+            images = [(key, None, _decode_legacy(row[0])) for row in cursor.fetchall()]
+            # Un FCL que cambió se reemplaza: así también desaparecen las imágenes borradas
+            cursor.execute(
+                "DELETE FROM image_metadata WHERE source = %s AND folder_key = %s", (source, key)
+            )
+        migrated += put_images(connection, source, [image for image in images if image[2] is not None])
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO image_migrations (source, folder_key, legacy_rows) VALUES (%s, %s, %s)
+                ON CONFLICT (source, folder_key)
+                DO UPDATE SET legacy_rows = EXCLUDED.legacy_rows, migrated_at = now()
+            """, (source, key, len(images)))
+        connection.commit()
+        print(f"   ✅ {i}/{len(keys)} {key}: {migrated} imágenes migradas")
+    return migrated
+
+
+def sync_sources(sources):
+    """
+    Migrar los FCL pendientes de cada origen con una conexión nueva
+
+    Returns:
+        bool: False si no se pudo conectar o falló la migración
+    """
+    from utils.handler_db import DB_CONFIG
+
+    try:
+        connection = psycopg2.connect(**DB_CONFIG)
+    except psycopg2.Error as e:
+        print(f"❌ No se pudo conectar con la base de datos: {e}")
+        return False
+    try:
+        for source in sources:
+            print(f"📦 Migrando {SOURCES[source]['table']}...")
+            print(f"✅ {migrate_legacy_images(connection, source)} imágenes migradas")
+        return True
+    except psycopg2.Error as e:
+        print(f"❌ Error al migrar imágenes: {e}")
+        return False
+    finally:
+        connection.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Migrar imágenes base64 a las tablas binarias")
+    parser.add_argument("sources", nargs="+", choices=sorted(SOURCES), help="Tablas heredadas a migrar")
+    parser.add_argument("--interval", type=int, default=0,
+                        help="Repetir cada N segundos para seguir a la tabla heredada (0 = una sola vez)")
+    args = parser.parse_args(argv)
+
+    if not args.interval:
+        return 0 if sync_sources(args.sources) else 1
+    while True:
+        # Un fallo (p. ej. la base reiniciándose) se reintenta en la siguiente vuelta
+        sync_sources(args.sources)
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
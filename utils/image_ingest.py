@@ -0,0 +1,111 @@
+"""
+Ingesta de imágenes de Google Drive al almacén de imágenes
+
+Pipeline compartido por la página de carga y el watcher de Drive: se listan
+las imágenes de cada carpeta FCL, se descartan las que ya están en el
+almacén sin cambios, se descargan en hilos, se optimizan en procesos y se
+registran en el índice.
+"""
+
+from utils.get_sheets import iter_images_in_folder, download_images, optimize_images
+from utils.image_store import get_image_store
+
+
+def image_record(folder, image):
+    """Fila del índice para una imagen de una carpeta de Drive"""
+    return {
+        'folder_id': folder['id'],
+        'folder_name': folder['name'],
+        'folder_webViewLink': folder.get('webViewLink'),
+        'folder_modifiedTime': folder.get('modifiedTime'),
+        'image_id': image['id'],
+        'image_name': image['name'],
+        'image_webViewLink': image.get('webViewLink'),
+        'image_modifiedTime': image.get('modifiedTime'),
+        'image_md5': image.get('md5Checksum'),
+    }
+
+
+def iter_pending(service, folders, image_store=None):
+    """
+    Imágenes nuevas o modificadas de las carpetas indicadas, a medida que se listan
+
+    Args:
+        service: Servicio de Google Drive
+        folders (list): Carpetas FCL (id, name, webViewLink, modifiedTime)
+        image_store: Almacén contra el que se compara (por defecto el compartido)
+
+    Yields:
+        (carpeta, imagen) a descargar
+    """
+    image_store = image_store or get_image_store()
+    for i, folder in enumerate(folders, 1):
+        print(f"\n📂 Procesando carpeta {i}/{len(folders)}: {folder['name']}")
+
+        counts = {'listed': 0, 'changed': 0}
+
+        def counted(images):
+            for image in images:
+                counts['listed'] += 1
+                yield image
+
+        listing = counted(iter_images_in_folder(service, folder['id']))
+        for image in image_store.iter_changed(listing):
+            counts['changed'] += 1
+            yield folder, image
+        listed, changed = counts['listed'], counts['changed']
+
+        if not listed:
+            print(f"   ⚠️  No se encontraron imágenes en '{folder['name']}'")
+            continue
+        print(f"   ✅ Se encontraron {listed} imágenes")
+        if changed < listed:
+            print(f"   ⏭️  {listed - changed} imágenes sin cambios, se omiten")
+
+
+def collect_pending(service, folders, image_store=None):
+    """Lista de `iter_pending`, para conocer el total antes de descargar"""
+    return list(iter_pending(service, folders, image_store))
+
+
+def ingest_images(pending, image_store=None, on_progress=None):
+    """
+    Descargar, optimizar y registrar imágenes pendientes
+
+    Args:
+        pending (iterable): Tuplas (carpeta, imagen) de `collect_pending`, o el
+            generador de `iter_pending` para descargar mientras se lista
+        image_store: Almacén destino (por defecto el compartido)
+        on_progress (callable): Recibe (procesadas, total, imagen) tras cada imagen;
+            total es None si `pending` es un generador
+
+    Returns:
+        pandas.DataFrame con las filas agregadas al índice
+    """
+    image_store = image_store or get_image_store()
+    records = []
+    total = len(pending) if hasattr(pending, '__len__') else None
+
+    # Descarga en hilos, optimización en procesos
+    downloads = download_images(pending, get_id=lambda item: item[1]['id'])
+    for j, ((folder, image), image_bytes) in enumerate(optimize_images(downloads), 1):
+        original_size_mb = int(image.get('size', 0)) / (1024 * 1024)
+        print(f"      🖼️  Procesando imagen {j}/{total or '?'}: {image['name']} ({original_size_mb:.2f}MB)")
+
+        record = image_record(folder, image)
+        if image_bytes:
+            # Calcular tamaño optimizado
+            optimized_size_mb = len(image_bytes) / (1024 * 1024)
+            reduction_percent = (1 - optimized_size_mb / original_size_mb) * 100 if original_size_mb > 0 else 0
+            print(f"         ✅ Imagen optimizada: {image['name']} ({reduction_percent:.1f}% reducción)")
+            record['image_bytes'] = image_bytes
+        else:
+            print(f"         ❌ Error al descargar o procesar {image['name']}")
+        # Si falló la descarga o el procesamiento se registra la fila sin imagen
+        records.append(record)
+
+        if on_progress:
+            on_progress(j, total, image)
+
+    # Guardar blobs por hash y agregar solo lo nuevo al índice
+    return image_store.add_images(records)
@@ -0,0 +1,508 @@
+"""
+Almacén de imágenes direccionado por contenido
+
+Los JPEG optimizados se guardan como archivos binarios nombrados por su
+hash SHA-256 (img/store/blobs/ab/abcd....jpg) y un índice Parquet pequeño
+guarda solo los metadatos (carpeta, id de Drive, hash, dimensiones, fecha).
+Junto a cada blob se guarda una miniatura de 256 px (img/store/thumbs/) que
+es lo que muestra la galería; la imagen completa se carga solo al pedirla.
+
+El índice está particionado por carpeta (img/store/index/folder_name=<FCL>/),
+así que consultar un FCL abre solo su partición, con las columnas necesarias,
+y el costo no depende de cuántos FCL se hayan cargado en la temporada.
+
+Cada ingesta agrega un fragmento nuevo a las particiones que toca, sin
+reescribir lo existente; un índice de claves (image_id -> hash) descarta lo
+ya registrado y un hilo en segundo plano compacta las particiones con muchos
+fragmentos. Las escrituras se serializan entre procesos con un FileLock.
+"""
+
+import os
+import io
+import base64
+import hashlib
+import time
+import threading
+from collections import OrderedDict
+import pandas as pd
+import pyarrow.parquet as pq
+from filelock import FileLock
+from PIL import Image
+from utils.file_utils import safe_name, atomic_write
+
+IMAGE_STORE_DIR = os.environ.get("IMAGE_STORE_DIR", os.path.join("img", "store"))
+LEGACY_PARQUET_PATH = os.path.join("img", "bd_img.parquet")
+# FCL recientes cuyas rutas de imágenes se mantienen en memoria
+IMAGE_CACHE_SIZE = 64
+# Miniaturas de la galería (lado máximo en px)
+THUMBNAIL_SIZE = 256
+THUMBNAIL_QUALITY = 75
+# Fragmentos por partición a partir de los cuales se compacta
+COMPACT_THRESHOLD = 8
+LOCK_TIMEOUT = 120
+
+INDEX_COLUMNS = [
+    'folder_id', 'folder_name', 'folder_webViewLink', 'folder_modifiedTime',
+    'image_id', 'image_name', 'image_webViewLink', 'image_modifiedTime',
+    'image_md5', 'hash', 'width', 'height', 'size_bytes',
+]
+# image_md5 / image_modifiedTime permiten saber sin descargar si cambió en Drive
+KEY_COLUMNS = ['image_id', 'folder_name', 'hash', 'image_md5', 'image_modifiedTime']
+
+
+def _latest_per_image(df):
+    """Última fila de cada image_id; una descarga fallida no reemplaza una imagen ya guardada"""
+    df = df.iloc[df['hash'].notna().argsort(kind='stable')]
+    return df.drop_duplicates(subset=['image_id'], keep='last')
+
+
+def image_dimensions(image_bytes):
+    """(ancho, alto) leyendo solo la cabecera de la imagen"""
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            return img.size
+    except Exception:
+        return (None, None)
+
+
+def decode_base64_image(value):
+    """Bytes de una imagen en base64, con o sin prefijo data:image"""
+    if value.startswith('data:image'):
+        value = value.split(',', 1)[1]
+    return base64.b64decode(value)
+
+
+def make_thumbnail(image_bytes, size=THUMBNAIL_SIZE, quality=THUMBNAIL_QUALITY):
+    """
+    Miniatura JPEG de una imagen
+
+    Args:
+        image_bytes (bytes): Imagen original
+        size (int): Lado máximo de la miniatura
+
+    Returns:
+        bytes: JPEG de la miniatura
+    """
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        # Decodificar el JPEG ya reducido
+        img.draft('RGB', (size, size))
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        img.thumbnail((size, size), Image.Resampling.LANCZOS)
+        output = io.BytesIO()
+        img.save(output, format='JPEG', quality=quality, optimize=True)
+        return output.getvalue()
+
+
+class ImageStore:
+    """Blobs JPEG por hash + índice de metadatos en Parquet"""
+
+    def __init__(self, root=IMAGE_STORE_DIR, cache_size=IMAGE_CACHE_SIZE):
+        self.root = root
+        self.blobs_dir = os.path.join(root, "blobs")
+        self.thumbs_dir = os.path.join(root, "thumbs")
+        self.index_dir = os.path.join(root, "index")
+        self.keys_path = os.path.join(root, "keys.parquet")
+        self._lock = FileLock(os.path.join(root, ".lock"), timeout=LOCK_TIMEOUT)
+        self._compaction_thread = None
+        self._paths_cache = OrderedDict()
+        self._cache_size = cache_size
+        self._cache_lock = threading.Lock()
+        os.makedirs(self.blobs_dir, exist_ok=True)
+        os.makedirs(self.index_dir, exist_ok=True)
+
+    def blob_path(self, image_hash):
+        """Ruta del archivo de un blob"""
+        return os.path.join(self.blobs_dir, image_hash[:2], f"{image_hash}.jpg")
+
+    def put_blob(self, image_bytes):
+        """
+        Guardar los bytes de una imagen y retornar su hash
+
+        Si ya existe un blob con el mismo contenido no se vuelve a escribir.
+        """
+        image_hash = hashlib.sha256(image_bytes).hexdigest()
+        path = self.blob_path(image_hash)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+            def write(tmp_path):
+                with open(tmp_path, "wb") as f:
+                    f.write(image_bytes)
+            atomic_write(path, write)
+        return image_hash
+
+    def thumbnail_path(self, image_hash):
+        """Ruta de la miniatura de un blob"""
+        return os.path.join(self.thumbs_dir, image_hash[:2], f"{image_hash}.jpg")
+
+    def put_thumbnail(self, image_hash, image_bytes=None):
+        """
+        Generar la miniatura de un blob si todavía no existe
+
+        Args:
+            image_hash (str): Hash del blob
+            image_bytes (bytes): Contenido del blob, si ya está en memoria
+
+        Returns:
+            str: Ruta de la miniatura
+        """
+        path = self.thumbnail_path(image_hash)
+        if not os.path.exists(path):
+            thumbnail = make_thumbnail(image_bytes or self.get_bytes(image_hash))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+            def write(tmp_path):
+                with open(tmp_path, "wb") as f:
+                    f.write(thumbnail)
+            atomic_write(path, write)
+        return path
+
+    def get_bytes(self, image_hash):
+        """Bytes de un blob"""
+        with open(self.blob_path(image_hash), "rb") as f:
+            return f.read()
+
+    def partition_dir(self, folder_name):
+        """Directorio de la partición del índice de una carpeta"""
+        return os.path.join(self.index_dir, f"folder_name={safe_name(folder_name)}")
+
+    def _partition_files(self, folder_name):
+        try:
+            with os.scandir(self.partition_dir(folder_name)) as entries:
+                return sorted(e.path for e in entries if e.name.endswith(".parquet"))
+        except FileNotFoundError:
+            return []
+
+    def _partition_version(self, folder_name):
+        """Archivos y mtime de la partición; cambia con cada escritura"""
+        return tuple(
+            (path, os.stat(path).st_mtime_ns) for path in self._partition_files(folder_name)
+        )
+
+    def folder_names(self):
+        """Carpetas con partición en el índice"""
+        with os.scandir(self.index_dir) as entries:
+            return sorted(
+                e.name.split("=", 1)[1] for e in entries
+                if e.is_dir() and e.name.startswith("folder_name=")
+            )
+
+    def _read_file(self, path, columns):
+        # Los fragmentos anteriores pueden no tener todas las columnas actuales
+        parquet_file = pq.ParquetFile(path)
+        available = [c for c in columns if c in parquet_file.schema_arrow.names]
+        return parquet_file.read(columns=available).to_pandas().reindex(columns=columns)
+
+    def _read_files(self, files, columns):
+        frames = [self._read_file(path, columns) for path in files]
+        frames = [df for df in frames if not df.empty]
+        if not frames:
+            return pd.DataFrame(columns=columns)
+        return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+    def _read_partition(self, folder_name, columns):
+        # Una compactación concurrente puede borrar fragmentos ya listados
+        for attempt in range(3):
+            try:
+                return self._read_files(self._partition_files(folder_name), columns)
+            except FileNotFoundError:
+                if attempt == 2:
+                    raise
+                time.sleep(0.05)
+
+    def read_index(self, folder_name=None, columns=None):
+        """
+        Índice de metadatos, opcionalmente solo de una carpeta (FCL)
+
+        Args:
+            folder_name (str): Carpeta a leer; solo se abre su partición
+            columns (list): Columnas a leer (por defecto INDEX_COLUMNS)
+
+        Returns:
+            pandas.DataFrame con la fila vigente de cada imagen
+        """
+        columns = list(columns or INDEX_COLUMNS)
+        read_columns = list(dict.fromkeys(columns + ['image_id', 'hash']))
+        names = self.folder_names() if folder_name is None else [folder_name]
+        frames = [self._read_partition(name, read_columns) for name in names]
+        frames = [df for df in frames if not df.empty]
+        if not frames:
+            return pd.DataFrame(columns=columns)
+        df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+        if folder_name is not None and 'folder_name' in df.columns:
+            # Dos carpetas pueden compartir el nombre saneado del directorio
+            df = df[df['folder_name'] == folder_name]
+        return _latest_per_image(df)[columns]
+
+    def _write_fragment(self, folder_name, df):
+        # El nombre ordena los fragmentos por antigüedad
+        name = f"part-{time.time_ns():020d}-{os.getpid()}.parquet"
+        path = os.path.join(self.partition_dir(folder_name), name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        atomic_write(path, lambda tmp: df.to_parquet(tmp, index=False))
+        return path
+
+    def _load_keys(self):
+        """Índice de claves; si no existe se reconstruye desde las particiones"""
+        if os.path.exists(self.keys_path):
+            return self._read_file(self.keys_path, KEY_COLUMNS)
+        keys = _latest_per_image(self.read_index(columns=KEY_COLUMNS))
+        self._save_keys(keys)
+        return keys
+
+    def _save_keys(self, keys):
+        atomic_write(self.keys_path, lambda tmp: keys.to_parquet(tmp, index=False))
+
+    def read_keys(self):
+        """Índice de claves (image_id -> carpeta, hash, md5, fecha) sin tomar el lock de escritura"""
+        if not os.path.exists(self.keys_path):
+            with self._lock:
+                return self._load_keys()
+        return self._read_file(self.keys_path, KEY_COLUMNS)
+
+    def iter_changed(self, images):
+        """
+        Imágenes de un listado de Drive que hay que descargar
+
+        Se descartan las que ya están en el almacén con el mismo md5Checksum
+        (o, si Drive no lo entrega, la misma modifiedTime). El índice de
+        claves se lee una vez y el listado se consume de forma perezosa.
+
+        Args:
+            images (iterable): Archivos de `files().list` con id, md5Checksum y modifiedTime
+
+        Yields:
+            dict: Imágenes nuevas, modificadas o cuya descarga falló antes
+        """
+        keys = self.read_keys()
+        keys = keys[keys['hash'].notna()].set_index('image_id')
+        for image in images:
+            if image['id'] not in keys.index:
+                yield image
+                continue
+            stored = keys.loc[image['id']]
+            md5 = image.get('md5Checksum')
+            if md5 and pd.notna(stored['image_md5']):
+                if md5 != stored['image_md5']:
+                    yield image
+            elif image.get('modifiedTime') != stored['image_modifiedTime']:
+                yield image
+
+    def select_changed(self, images):
+        """Lista de `iter_changed`"""
+        return list(self.iter_changed(images))
+
+    def add_images(self, records):
+        """
+        Registrar imágenes en el almacén
+
+        Solo se escriben las imágenes nuevas o cuyo contenido cambió, como un
+        fragmento nuevo por carpeta; el costo depende del lote, no del archivo.
+
+        Args:
+            records (list): Diccionarios con los metadatos de INDEX_COLUMNS y
+                opcionalmente `image_bytes`; si se incluye, se guarda el blob y se
+                completan hash, dimensiones y tamaño
+
+        Returns:
+            pandas.DataFrame con las filas agregadas al índice
+        """
+        rows = []
+        for record in records:
+            # Las carpetas sin imágenes no tienen nada que indexar
+            if record.get('image_id') is None:
+                continue
+            row = {col: record.get(col) for col in INDEX_COLUMNS}
+            image_bytes = record.get('image_bytes')
+            if image_bytes:
+                row['hash'] = self.put_blob(image_bytes)
+                try:
+                    self.put_thumbnail(row['hash'], image_bytes)
+                except Exception as e:
+                    print(f"⚠️ No se pudo generar la miniatura de {row['image_name']}: {e}")
+                row['width'], row['height'] = image_dimensions(image_bytes)
+                row['size_bytes'] = len(image_bytes)
+            rows.append(row)
+
+        new_df = pd.DataFrame(rows, columns=INDEX_COLUMNS)
+        if new_df.empty:
+            return new_df
+        new_df = _latest_per_image(new_df)
+
+        with self._lock:
+            keys = self._load_keys()
+            known_hash = keys.set_index('image_id')['hash']
+            known_md5 = keys.set_index('image_id')['image_md5']
+            previous = new_df['image_id'].map(known_hash)
+            is_new = ~new_df['image_id'].isin(known_hash.index)
+            changed = new_df['hash'].notna() & (
+                (new_df['hash'] != previous)
+                | (new_df['image_md5'].notna() & (new_df['image_md5'] != new_df['image_id'].map(known_md5)))
+            )
+            new_df = new_df[is_new | changed]
+            if new_df.empty:
+                return new_df
+
+            for folder_name, folder_df in new_df.groupby('folder_name', dropna=False, sort=False):
+                self._write_fragment(folder_name, folder_df)
+
+            keys = pd.concat([keys, new_df[KEY_COLUMNS]], ignore_index=True)
+            self._save_keys(keys.drop_duplicates(subset=['image_id'], keep='last'))
+
+        self.schedule_compaction(new_df['folder_name'].unique())
+        return new_df
+
+    def compact(self, folder_names=None, threshold=COMPACT_THRESHOLD):
+        """
+        Fusionar los fragmentos de cada partición en uno solo
+
+        Se descartan las filas reemplazadas y las de imágenes que el índice de
+        claves ubica ahora en otra carpeta.
+
+        Args:
+            folder_names (list): Carpetas a compactar (por defecto todas)
+            threshold (int): Mínimo de fragmentos para compactar una partición
+
+        Returns:
+            int: Particiones compactadas
+        """
+        compacted = 0
+        with self._lock:
+            keys = self._load_keys()
+            key_folder = keys.set_index('image_id')['folder_name']
+            for folder_name in (folder_names if folder_names is not None else self.folder_names()):
+                files = self._partition_files(folder_name)
+                if len(files) < max(threshold, 2):
+                    continue
+                df = _latest_per_image(self._read_files(files, INDEX_COLUMNS))
+                df = df[df['image_id'].map(key_folder) == df['folder_name']]
+                self._write_fragment(folder_name, df)
+                for path in files:
+                    os.remove(path)
+                compacted += 1
+        return compacted
+
+    def schedule_compaction(self, folder_names, threshold=COMPACT_THRESHOLD):
+        """Compactar en segundo plano las particiones que superen el umbral"""
+        pending = [
+            name for name in folder_names
+            if len(self._partition_files(name)) >= threshold
+        ]
+        if not pending:
+            return
+        with self._cache_lock:
+            if self._compaction_thread is not None and self._compaction_thread.is_alive():
+                return
+
+            def run():
+                try:
+                    count = self.compact(pending, threshold)
+                    print(f"🗜️ Compactadas {count} particiones del índice de imágenes")
+                except Exception as e:
+                    print(f"⚠️ Error al compactar el índice de imágenes: {e}")
+
+            self._compaction_thread = threading.Thread(
+                target=run, name="image-index-compaction", daemon=True
+            )
+            self._compaction_thread.start()
+
+    def list_images(self, folder_name, columns=None):
+        """Metadatos de las imágenes disponibles de un FCL"""
+        if columns is not None and 'hash' not in columns:
+            columns = list(columns) + ['hash']
+        df = self.read_index(folder_name, columns=columns)
+        return df[df['hash'].notna()]
+
+    def get_image_hashes(self, folder_name):
+        """
+        Hashes de las imágenes de un FCL
+
+        Los FCL consultados recientemente se sirven desde un LRU en memoria
+        mientras su partición no cambie.
+        """
+        version = self._partition_version(folder_name)
+        with self._cache_lock:
+            cached = self._paths_cache.get(folder_name)
+            if cached is not None and cached[0] == version:
+                self._paths_cache.move_to_end(folder_name)
+                return list(cached[1])
+
+        df = self.list_images(folder_name, columns=['folder_name', 'hash'])
+        hashes = df['hash'].tolist()
+
+        with self._cache_lock:
+            self._paths_cache[folder_name] = (version, hashes)
+            self._paths_cache.move_to_end(folder_name)
+            while len(self._paths_cache) > self._cache_size:
+                self._paths_cache.popitem(last=False)
+        return list(hashes)
+
+    def get_image_paths(self, folder_name):
+        """Rutas de los blobs de un FCL, utilizables por st.image y el PDF"""
+        return [self.blob_path(h) for h in self.get_image_hashes(folder_name)]
+
+    def get_thumbnail_paths(self, folder_name):
+        """
+        Rutas de las miniaturas de un FCL, en el mismo orden que `get_image_paths`
+
+        Las imágenes migradas antes de existir las miniaturas las generan aquí
+        una única vez.
+        """
+        return [self.put_thumbnail(h) for h in self.get_image_hashes(folder_name)]
+
+    def migrate_flat_index(self):
+        """
+        Repartir por carpeta un índice plano img/store/index.parquet anterior
+
+        Returns:
+            int: Número de filas migradas
+        """
+        flat_path = os.path.join(self.root, "index.parquet")
+        if not os.path.exists(flat_path):
+            return 0
+        flat = pd.read_parquet(flat_path)
+        with self._lock:
+            for folder_name, folder_df in flat.groupby('folder_name', dropna=False, sort=False):
+                self._write_fragment(folder_name, folder_df.reindex(columns=INDEX_COLUMNS))
+            os.remove(flat_path)
+        print(f"✅ Índice de imágenes particionado por carpeta ({len(flat)} filas)")
+        return len(flat)
+
+    def migrate_legacy_parquet(self, path=LEGACY_PARQUET_PATH):
+        """
+        Importar el antiguo img/bd_img.parquet con imágenes en base64
+
+        Returns:
+            int: Número de filas importadas
+        """
+        if not os.path.exists(path):
+            return 0
+        legacy = pd.read_parquet(path)
+        records = []
+        for record in legacy.to_dict(orient="records"):
+            image_base64 = record.pop('image_base64', None)
+            if isinstance(image_base64, str):
+                record['image_bytes'] = decode_base64_image(image_base64)
+            records.append(record)
+        self.add_images(records)
+        print(f"✅ Migradas {len(records)} filas de {path} al almacén de imágenes")
+        return len(records)
+
+
+_image_store = None
+_image_store_lock = threading.Lock()
+
+
+def get_image_store():
+    """Almacén compartido; en el primer uso migra bd_img.parquet si existe"""
+    global _image_store
+    if _image_store is None:
+        with _image_store_lock:
+            if _image_store is None:
+                store = ImageStore()
+                store.migrate_flat_index()
+                if not store.folder_names():
+                    store.migrate_legacy_parquet()
+                _image_store = store
+    return _image_store
@@ -15,8 +15,14 @@ from reportlab.graphics.shapes import Drawing, Rect
 from reportlab.graphics import renderPDF
 import pandas as pd
 import base64
+from itertools import islice
 from PIL import Image as PILImage
 import os
+from utils.image_store import make_thumbnail
+
+# Lado máximo (px) y calidad JPEG de las fotos incrustadas en el PDF
+PDF_IMAGE_MAX_SIDE = 1000
+PDF_IMAGE_QUALITY = 80
 
 
 class QualityControlReportGenerator:
@@ -170,7 +176,7 @@ class QualityControlReportGenerator:
             fcl_data: Dictionary with FCL summary information
             detailed_records: DataFrame with detailed quality records
             output_path: Optional file path to save PDF
-            images_list: List of base64 encoded images
+            images_list: Iterable of images (bytes, image store paths or base64)
             
         Returns:
             BytesIO buffer with PDF content
@@ -573,91 +579,93 @@ class QualityControlReportGenerator:
         
         return story
 
+    def _pdf_image(self, image, number, width, height):
+        """
+        Flowable de una imagen reducida a resolución de impresión
+
+        La imagen puede venir como bytes, ruta del almacén o string base64. Se
+        reduce a PDF_IMAGE_MAX_SIDE al agregarla, así el story solo retiene la
+        versión reducida y no el original hasta construir el PDF.
+        """
+        try:
+            if isinstance(image, (bytes, bytearray, memoryview)):
+                image_bytes = bytes(image)
+            elif isinstance(image, str) and os.path.isfile(image):
+                with open(image, 'rb') as f:
+                    image_bytes = f.read()
+            elif not isinstance(image, str):
+                return Paragraph(f"Error: formato inválido", self.small_style)
+            else:
+                # Limpiar el string base64 si tiene prefijo data:image
+                if image.startswith('data:image'):
+                    image = image.split(',')[1]
+                try:
+                    image_bytes = base64.b64decode(image)
+                except Exception:
+                    return Paragraph(f"Error: base64 inválido", self.small_style)
+
+            # Si no se puede reducir, tampoco se podría dibujar: queda el placeholder de abajo
+            image_bytes = make_thumbnail(image_bytes, size=PDF_IMAGE_MAX_SIDE, quality=PDF_IMAGE_QUALITY)
+            return Image(io.BytesIO(image_bytes), width=width, height=height, kind='proportional')
+
+        except Exception as e:
+            # Si hay error, crear placeholder
+            return Paragraph(f"Error imagen {number}: {str(e)[:30]}", self.small_style)
+
     def _create_photos_section(self, images_list):
-        """Create photos section with actual images"""
-        story = []
+        """
+        Create photos section with actual images
 
-       
-        if images_list and len(images_list) > 0:
-           pass
-        
-        images_list = images_list or []
+        `images_list` can be any iterable (e.g. a generator streaming from the
+        database); images are consumed one at a time and never indexed.
+        """
+        story = []
         
         # Photos header
         story.append(Paragraph("📸 IMAGENES ", self.subheader_style))
         
-        if len(images_list) > 0:
-            try:
-                # Organizar imágenes en filas de 3 con tamaño optimizado
-                cols_per_row = 3
-                # Calcular ancho disponible (A4 - márgenes) / 3 columnas
-                available_width = 7.5 * inch  # A4 width - margins
-                img_width = available_width / cols_per_row - 0.1 * inch  # Pequeño espacio entre imágenes
-                img_height = 1.8 * inch  # Altura estándar para buena proporción
-                
-                for i in range(0, len(images_list), cols_per_row):
-                    row_images = []
-                    for j in range(cols_per_row):
-                        if i + j < len(images_list):
-                            try:
-                                # Verificar que la imagen sea un string base64 válido
-                                img_base64 = images_list[i + j]
-                                
-                                
-                                if not isinstance(img_base64, str):
-                                    
-                                    placeholder = Paragraph(f"Error: formato inválido", self.small_style)
-                                    row_images.append(placeholder)
-                                    continue
-                                
-                                # Limpiar el string base64 si tiene prefijo data:image
-                                if img_base64.startswith('data:image'):
-                                    # Extraer solo la parte base64
-                                    img_base64 = img_base64.split(',')[1]
-                                
-                                # Decodificar imagen base64
-                                try:
-                                    img_data = base64.b64decode(img_base64)
-                                    img_buffer = io.BytesIO(img_data)
-                                except Exception as decode_error:
-                                   
-                                    placeholder = Paragraph(f"Error: base64 inválido", self.small_style)
-                                    row_images.append(placeholder)
-                                    continue
-                                
-                                # Crear imagen para PDF con tamaño optimizado
-                                img = Image(img_buffer, width=img_width, height=img_height, kind='proportional')
-                                row_images.append(img)
-                                
-                            except Exception as e:
-                                # Si hay error, crear placeholder
-                                
-                                placeholder = Paragraph(f"Error imagen {i+j+1}: {str(e)[:30]}", self.small_style)
-                                row_images.append(placeholder)
-                        else:
-                            # Espacio vacío si no hay más imágenes
-                            row_images.append(Paragraph("", self.small_style))
-                    
-                    # Crear tabla para esta fila de imágenes
-                    if len(row_images) > 0:
-                        img_table = Table([row_images], colWidths=[img_width, img_width, img_width])
-                        img_table.setStyle(TableStyle([
-                            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                            ('LEFTPADDING', (0, 0), (-1, -1), 3),
-                            ('RIGHTPADDING', (0, 0), (-1, -1), 3),
-                            ('TOPPADDING', (0, 0), (-1, -1), 3),
-                            ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
-                        ]))
-                        story.append(img_table)
-                        story.append(Spacer(1, 8))
-                
-                # Agregar información sobre las imágenes
-                story.append(Paragraph(f"Total de imágenes incluidas: {len(images_list)}", self.small_style))
-                
-            except Exception as e:
+        images = iter(images_list if images_list is not None else [])
+        total = 0
+        try:
+            # Organizar imágenes en filas de 3 con tamaño optimizado
+            cols_per_row = 3
+            # Calcular ancho disponible (A4 - márgenes) / 3 columnas
+            available_width = 7.5 * inch  # A4 width - margins
+            img_width = available_width / cols_per_row - 0.1 * inch  # Pequeño espacio entre imágenes
+            img_height = 1.8 * inch  # Altura estándar para buena proporción
+            
+            while True:
+                chunk = list(islice(images, cols_per_row))
+                if not chunk:
+                    break
+                row_images = [
+                    self._pdf_image(image, total + k + 1, img_width, img_height)
+                    for k, image in enumerate(chunk)
+                ]
+                total += len(chunk)
+                # Espacio vacío si no hay más imágenes
+                row_images += [Paragraph("", self.small_style)] * (cols_per_row - len(chunk))
                 
-                story.append(Paragraph(f"Error al procesar imágenes: {str(e)}", self.small_style))
+                # Crear tabla para esta fila de imágenes
+                img_table = Table([row_images], colWidths=[img_width, img_width, img_width])
+                img_table.setStyle(TableStyle([
+                    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+                    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+                    ('LEFTPADDING', (0, 0), (-1, -1), 3),
+                    ('RIGHTPADDING', (0, 0), (-1, -1), 3),
+                    ('TOPPADDING', (0, 0), (-1, -1), 3),
+                    ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
+                ]))
+                story.append(img_table)
+                story.append(Spacer(1, 8))
+            
+        except Exception as e:
+            
+            story.append(Paragraph(f"Error al procesar imágenes: {str(e)}", self.small_style))
+        
+        if total > 0:
+            # Agregar información sobre las imágenes
+            story.append(Paragraph(f"Total de imágenes incluidas: {total}", self.small_style))
         else:
             story.append(Paragraph("No hay imágenes disponibles para este FCL", self.small_style))
         
@@ -724,7 +732,7 @@ def generate_fcl_pdf_report(fcl_data, detailed_records, images_list=None):
     Args:
         fcl_data: Dictionary with FCL summary information
         detailed_records: DataFrame with detailed quality records
-        images_list: List of base64 encoded images
+        images_list: Iterable of images (bytes, image store paths or base64)
         
     Returns:
         BytesIO buffer with PDF content
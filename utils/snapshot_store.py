@@ -0,0 +1,116 @@
+"""
+Snapshots columnares (Parquet) de hojas de Excel ya normalizadas
+
+Cada snapshot se identifica por un nombre y la versión de su origen (cTag
+del driveItem o mtime/tamaño del archivo local). Mientras la versión no
+cambie, las cargas se sirven desde el Parquet con memory-map en lugar de
+volver a parsear el XLSX con openpyxl.
+"""
+
+import os
+import json
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from utils.file_utils import safe_name, atomic_write
+
+SNAPSHOT_DIR = os.environ.get("SNAPSHOT_DIR", os.path.join("data", "snapshots"))
+
+
+def file_version(path):
+    """Versión de un archivo local a partir de su mtime y tamaño"""
+    stat = os.stat(path)
+    return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+
+class SnapshotStore:
+    """Almacén de snapshots Parquet versionados por origen"""
+
+    def __init__(self, snapshot_dir=SNAPSHOT_DIR):
+        self.snapshot_dir = snapshot_dir
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+
+    def _paths(self, name):
+        base = os.path.join(self.snapshot_dir, safe_name(name))
+        return {
+            "meta": f"{base}.json",
+            "parquet": f"{base}.parquet",
+            "pickle": f"{base}.pkl",
+        }
+
+    def load(self, name, version):
+        """
+        Cargar un snapshot si corresponde a la versión indicada
+
+        Args:
+            name (str): Nombre del snapshot
+            version (str): Versión actual del origen
+
+        Returns:
+            pandas.DataFrame, o None si no existe o está desactualizado
+        """
+        paths = self._paths(name)
+        try:
+            with open(paths["meta"], "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        if meta.get("version") != version:
+            return None
+
+        try:
+            if meta.get("format") == "parquet":
+                return pd.read_parquet(paths["parquet"], memory_map=True)
+            return pd.read_pickle(paths["pickle"])
+        except Exception as e:
+            print(f"⚠️ Snapshot '{name}' ilegible, se regenerará: {e}")
+            return None
+
+    def save(self, name, version, df):
+        """
+        Guardar un DataFrame como snapshot de la versión indicada
+
+        Las columnas con tipos mezclados que Arrow no puede representar hacen
+        que el snapshot se guarde en pickle para no perder los valores.
+        """
+        paths = self._paths(name)
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=True)
+            atomic_write(paths["parquet"], lambda path: pq.write_table(table, path))
+            fmt = "parquet"
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError, ValueError) as e:
+            print(f"⚠️ Snapshot '{name}' con tipos mixtos, se guarda en pickle: {e}")
+            atomic_write(paths["pickle"], lambda path: df.to_pickle(path))
+            fmt = "pickle"
+
+        meta = {"version": version, "format": fmt, "rows": len(df)}
+
+        def write_meta(path):
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+        atomic_write(paths["meta"], write_meta)
+
+    def get_or_build(self, name, version, build_fn):
+        """
+        Servir el snapshot vigente o construirlo con `build_fn` y guardarlo
+
+        Args:
+            name (str): Nombre del snapshot
+            version (str): Versión actual del origen
+            build_fn (callable): Función sin argumentos que retorna el DataFrame
+
+        Returns:
+            pandas.DataFrame
+        """
+        df = self.load(name, version)
+        if df is not None:
+            return df
+
+        df = build_fn()
+        self.save(name, version, df)
+        return df
+
+
+# Instancia global del almacén de snapshots
+snapshot_store = SnapshotStore()
@@ -0,0 +1,53 @@
+"""
+Lectura de varias hojas de un libro de Excel en una sola pasada
+
+`pd.read_excel` abre el zip y parsea la tabla de shared strings en cada
+llamada; aquí el libro se abre una vez y se extraen todas las hojas
+pedidas, cada una con sus propios `skiprows` / `usecols`.
+"""
+
+import pandas as pd
+from utils.snapshot_store import snapshot_store
+
+
+def read_sheets(source, specs):
+    """
+    Leer varias hojas abriendo el libro una sola vez
+
+    Args:
+        source: Ruta o buffer del archivo .xlsx
+        specs (dict): {clave: {"sheet_name": ..., "skiprows": ..., "usecols": ...}}
+
+    Returns:
+        dict: {clave: DataFrame}
+    """
+    with pd.ExcelFile(source) as xls:
+        return {key: xls.parse(**spec) for key, spec in specs.items()}
+
+
+def load_sheets(name, version, source, specs):
+    """
+    Hojas de un libro cacheadas como unidad en el almacén de snapshots
+
+    Si alguna hoja no tiene snapshot vigente se relee el libro completo en
+    una sola pasada y se guardan todas.
+
+    Args:
+        name (str): Prefijo de los snapshots del libro
+        version (str): Versión del origen (cTag o mtime)
+        source: Ruta/buffer del libro, o función sin argumentos que lo retorna
+        specs (dict): Igual que en `read_sheets`
+
+    Returns:
+        dict: {clave: DataFrame}
+    """
+    frames = {key: snapshot_store.load(f"{name}__{key}", version) for key in specs}
+    if all(df is not None for df in frames.values()):
+        return frames
+
+    if callable(source):
+        source = source()
+    frames = read_sheets(source, specs)
+    for key, df in frames.items():
+        snapshot_store.save(f"{name}__{key}", version, df)
+    return frames
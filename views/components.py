@@ -0,0 +1,38 @@
+"""
+Componentes de interfaz compartidos por las vistas
+"""
+
+import streamlit as st
+
+
+def show_image_gallery(thumbnails, load_full_image, key, ids=None):
+    """
+    Grilla de miniaturas en 3 columnas; la imagen completa se envía solo al pedirla
+
+    Args:
+        thumbnails (list): Miniaturas (ruta o bytes) aceptadas por st.image
+        load_full_image (callable): Recibe el id (o el índice) y retorna la imagen
+            completa, o None si ya no existe
+        key (str): Prefijo de las claves de session_state y de los botones
+        ids (list): Id estable de cada miniatura; por defecto su índice
+    """
+    ids = list(range(len(thumbnails))) if ids is None else list(ids)
+    state_key = f"{key}_imagen_ampliada"
+    selected = st.session_state.get(state_key)
+    if selected is not None and selected in ids:
+        image = load_full_image(selected)
+        if image is None:
+            st.warning("⚠️ La imagen ya no está disponible; recarga las imágenes")
+        else:
+            st.image(image, use_column_width=True)
+        if st.button("✖️ Cerrar imagen", key=f"{key}_cerrar"):
+            del st.session_state[state_key]
+            st.rerun()
+
+    col_img = st.columns(3)
+    for i, thumbnail in enumerate(thumbnails):
+        with col_img[i % 3]:
+            st.image(thumbnail, width=200)
+            if st.button("🔍 Ver", key=f"{key}_ver_{i}"):
+                st.session_state[state_key] = ids[i]
+                st.rerun()
@@ -4,9 +4,15 @@ import numpy as np
 from datetime import datetime, timedelta
 import plotly.express as px
 import plotly.graph_objects as go
-from utils.get_api import listar_archivos_en_carpeta_compartida, get_download_url_by_name, test_json
+from utils.get_api import listar_archivos_en_carpeta_compartida, get_download_url_by_name, get_item_by_name, test_json
+from utils.graph_client import download_file
+from utils.download_cache import download_cache
+from utils.workbook_reader import read_sheets
+from utils.data_engine import FclIndex
 from utils.get_token import get_access_token, get_access_token_alza
-from utils.handler_db import get_img_despacho_data
+from utils.handler_db import get_img_despacho_data, get_img_despacho_counts, invalidate_img_despacho_cache
+from utils.image_store import make_thumbnail
+from views.components import show_image_gallery
 from utils.pdf_generator import generate_fcl_pdf_report
 import base64
 import zipfile
@@ -75,16 +81,15 @@ def clean_cod_column(cod):
     print(f"No match found for: {cod}")
     return cod
 
-@st.cache_data(ttl=300,show_spinner="Cargando datos...")
-def get_programacion_despachos():
-    access_token = get_access_token_alza()
-    DATAS = listar_archivos_en_carpeta_compartida(access_token, "b!VQYmeHVjYEWz0GKghOyC7vEXg4ECVBhNtIUi_0GrC_YtxGLZYwDkTIeZ8M0lJvFk", "01YFYVLBY2AXGEFA43KBCLDKFUHBDMF2OP")
-    data_ = get_download_url_by_name(DATAS, "PROGRAMACION.xlsx")
-    aereo = pd.read_excel(data_, sheet_name="PROGRAMA ALZA PACKING AEREO", skiprows=1)
-    aereo = aereo.drop(["Unnamed: 0"], axis=1)
+def normalize_programacion_despachos(data_):
+    """Leer y normalizar las hojas AEREO y MARITIMO de PROGRAMACION.xlsx"""
+    sheets = read_sheets(data_, {
+        "aereo": {"sheet_name": "PROGRAMA ALZA PACKING AEREO", "skiprows": 1},
+        "maritimo": {"sheet_name": "PROGRAMA ALZA PACKING MARITIMO", "skiprows": 1},
+    })
+    aereo = sheets["aereo"].drop(["Unnamed: 0"], axis=1)
     aereo["ENVIO"] = "AEREO"
-    maritimo = pd.read_excel(data_, sheet_name="PROGRAMA ALZA PACKING MARITIMO", skiprows=1)
-    maritimo = maritimo.drop(["Unnamed: 0"], axis=1)
+    maritimo = sheets["maritimo"].drop(["Unnamed: 0"], axis=1)
     maritimo["ENVIO"] = "MARITIMO"
     
     despacho_ = pd.concat([aereo, maritimo], ignore_index=True)
@@ -95,6 +100,46 @@ def get_programacion_despachos():
     despacho_ = despacho_.rename(columns={"COD":"FCL","DIA  DESP.":"FECHA DE DESPACHO"})
     return despacho_
 
+@st.cache_data(ttl=300,show_spinner="Cargando datos...")
+def get_programacion_despachos():
+    access_token = get_access_token_alza()
+    DATAS = listar_archivos_en_carpeta_compartida(access_token, "b!VQYmeHVjYEWz0GKghOyC7vEXg4ECVBhNtIUi_0GrC_YtxGLZYwDkTIeZ8M0lJvFk", "01YFYVLBY2AXGEFA43KBCLDKFUHBDMF2OP")
+    item = get_item_by_name(DATAS, "PROGRAMACION.xlsx")
+    # Snapshot Parquet ya normalizado, invalidado por el cTag del archivo
+    return download_cache.load_frame(item, normalize_programacion_despachos, key="programacion")
+
+@st.cache_resource(ttl=300, show_spinner=False)
+def get_despachos_limpios():
+    """
+    Programación de despachos limpia y ordenada, con su índice por FCL
+
+    Returns:
+        tuple: (DataFrame, FclIndex) compartidos entre sesiones; no modificar en sitio
+    """
+    dff = get_programacion_despachos()
+    
+    # Convertir fechas
+    date_columns = ['FECHA DE DESPACHO', 'ETD', 'ETA']
+    for col in date_columns:
+        if col in dff.columns:
+            dff[col] = pd.to_datetime(dff[col], errors='coerce')
+    
+    # Fill NaN values
+    dff = dff.fillna("-")
+    
+    # Limpiar strings
+    string_columns = ["FCL", "CLIENTE", "EMPRESA", "DESTINO", "ENVIO", "ESTADO", "PRESENTACION"]
+    for col in string_columns:
+        if col in dff.columns:
+            dff[col] = dff[col].astype(str).str.strip()
+    
+    # Filtrar datos válidos
+    dff = dff[dff["FCL"] != "-"]
+    dff = dff[dff["FCL"].notna()]
+    
+    dff = dff.sort_values(by="FECHA DE DESPACHO", ascending=False)
+    return dff, FclIndex(dff, column="FCL")
+
 
 
 def show_despacho():
@@ -111,7 +156,7 @@ def show_despacho():
     def get_data():
         access_token = get_access_token_alza()
         DATAS = listar_archivos_en_carpeta_compartida(access_token, "b!VQYmeHVjYEWz0GKghOyC7vEXg4ECVBhNtIUi_0GrC_YtxGLZYwDkTIeZ8M0lJvFk", "01YFYVLBY2AXGEFA43KBCLDKFUHBDMF2OP")
-        data_ = get_download_url_by_name(DATAS, "DESPACHOS_EXCELLENCE FRUIT.xlsx")
+        data_ = download_file(get_download_url_by_name(DATAS, "DESPACHOS_EXCELLENCE FRUIT.xlsx"))
         exc_despachos_df = pd.read_excel(data_, sheet_name="camp 2025")
  
         return  exc_despachos_df
@@ -119,7 +164,7 @@ def show_despacho():
     def get_data_img():
         access_token = get_access_token_alza()
         DATAS = listar_archivos_en_carpeta_compartida(access_token, "b!M5ucw3aa_UqBAcqv3a6affR7vTZM2a5ApFygaKCcATxyLdOhkHDiRKl9EvzaYbuR", "01XOBWFSBLVGULAQNEKNG2WR7CPRACEN7Q")
-        data_ = get_download_url_by_name(DATAS, "despacho_img.xlsx")
+        data_ = download_file(get_download_url_by_name(DATAS, "despacho_img.xlsx"))
         print(data_)
         df = pd.read_excel(data_)
         return  df
@@ -127,7 +172,7 @@ def show_despacho():
     def get_lista_maestra():
         access_token = get_access_token()
         DATAS = listar_archivos_en_carpeta_compartida(access_token, "b!oArJxyQJjk2YBRLaxF9M6-wEuCX8zKZAl30NL3kNPhUNCKEYLTZmTYa0i4oZ1qxK", "01OAW3XC5MKUBY6XFXQVDLAQAM6OHH5C5Z")
-        data_ = get_download_url_by_name(DATAS, "LISTA MAESTRA DE DESPACHOS 2025.xlsx")
+        data_ = download_file(get_download_url_by_name(DATAS, "LISTA MAESTRA DE DESPACHOS 2025.xlsx"))
         
         exc_despachos_df = pd.read_excel(data_, sheet_name="CONTROL DE DESPACHOS", skiprows=4)
         exc_despachos_df = exc_despachos_df.drop(["Unnamed: 0","Unnamed: 3","Unnamed: 6","Unnamed: 16","Unnamed: 17"], axis=1)
@@ -168,38 +213,14 @@ def show_despacho():
     #lista_maestra["Nº FCL"] = lista_maestra["Nº FCL"].str.strip()
     #st.dataframe(lista_maestra)
     
-    # Cargar y limpiar datos
-    dff = get_programacion_despachos()
-    
-    
-    # Convertir fechas
-    if 'FECHA DE DESPACHO' in dff.columns:
-        dff['FECHA DE DESPACHO'] = pd.to_datetime(dff['FECHA DE DESPACHO'], errors='coerce')
-    if 'ETD' in dff.columns:
-        dff['ETD'] = pd.to_datetime(dff['ETD'], errors='coerce')
-    if 'ETA' in dff.columns:
-        dff['ETA'] = pd.to_datetime(dff['ETA'], errors='coerce')
-    
-    # Fill NaN values
-    dff = dff.fillna("-")
-    
-    # Limpiar strings
-    string_columns = ["FCL", "CLIENTE", "EMPRESA", "DESTINO", "ENVIO", "ESTADO", "PRESENTACION"]
-    for col in string_columns:
-        if col in dff.columns:
-            dff[col] = dff[col].astype(str).str.strip()
-    
-    # Filtrar datos válidos
-    dff = dff[dff["FCL"] != "-"]
-    dff = dff[dff["FCL"].notna()]
-    
-    dff = dff.sort_values(by="FECHA DE DESPACHO", ascending=False)
+    # Cargar datos limpios e índice por FCL (cacheados)
+    dff, fcl_index = get_despachos_limpios()
     
     # Barra de búsqueda y filtros
     col1, col2 = st.columns([5, 2])
     
     with col1:
-        search_term = st.multiselect("Buscar FCL", sorted(dff["FCL"].unique()))
+        search_term = st.multiselect("Buscar FCL", fcl_index.fcls)
         if search_term != [] or len(search_term) > 0:
             dff = dff[dff["FCL"].isin(search_term)]
     
@@ -217,12 +238,15 @@ def show_despacho():
         resumen_despacho_df = resumen_despacho_df.sort_values(by="FECHA DE DESPACHO", ascending=False)
         resumen_despacho_df = resumen_despacho_df.head(10)
     
+    # Cantidad de imágenes de todas las tarjetas en una consulta, solo con metadatos
+    img_counts = get_img_despacho_counts(tuple(f"{fcl}" for fcl in resumen_despacho_df['FCL']))
+    
     # Mostrar tarjetas de despacho
     with st.container():
         for i, row in resumen_despacho_df.iterrows():
             # Obtener el primer registro del FCL para mostrar información detallada
             fcl_number = row['FCL']
-            fcl_detail_row = dff[dff['FCL'] == fcl_number].iloc[0]
+            fcl_detail_row = fcl_index.first(fcl_number)
             
             # Crear tarjeta clickeable
             col1, col2 = st.columns([3, 1])
@@ -234,6 +258,9 @@ def show_despacho():
                 cliente_info = row.get('CLIENTE', 'N/A')
                 empresa_info = row.get('EMPRESA', 'N/A')
                 estado_info = row.get('ESTADO', 'N/A')
+                imagenes_info = ""
+                if img_counts is not None:
+                    imagenes_info = f"""<p style="margin: 2px 0; font-size: 13px; color: var(--text-color, #666); opacity: 0.9;"><strong>Imágenes:</strong> 📸 {img_counts.get(f"{fcl_number}".strip(), 0)}</p>"""
                 
                 st.markdown(f"""
                 <div class="clickable-card" onclick="openModal_{i}()" style="cursor: pointer;">
@@ -245,6 +272,7 @@ def show_despacho():
                         <p style="margin: 2px 0; font-size: 13px; color: var(--text-color, #666); opacity: 0.9;"><strong>Cliente:</strong> {cliente_info}</p>
                         <p style="margin: 2px 0; font-size: 13px; color: var(--text-color, #666); opacity: 0.9;"><strong>Empresa:</strong> {empresa_info}</p>
                         <p style="margin: 2px 0; font-size: 13px; color: var(--text-color, #666); opacity: 0.9;"><strong>Estado:</strong> {estado_info}</p>
+                        {imagenes_info}
                     </div>
                 </div>
                 """, unsafe_allow_html=True)
@@ -813,30 +841,9 @@ def show_despacho_detail_view():
     fcl_number = st.session_state.selected_fcl
     row = st.session_state.selected_fcl_data
     
-    # Cargar datos completos
-    dff = get_programacion_despachos()
-    
-    # Convertir fechas
-    date_columns = ['FECHA DE DESPACHO', 'ETD', 'ETA']
-    for col in date_columns:
-        if col in dff.columns:
-            dff[col] = pd.to_datetime(dff[col], errors='coerce')
-    
-    # Fill NaN values
-    dff = dff.fillna("-")
-    
-    # Limpiar strings
-    string_columns = ["FCL", "CLIENTE", "EMPRESA", "DESTINO", "ENVIO", "ESTADO", "PRESENTACION"]
-    for col in string_columns:
-        if col in dff.columns:
-            dff[col] = dff[col].astype(str).str.strip()
-    
-    # Filtrar datos válidos
-    dff = dff[dff["FCL"] != "-"]
-    dff = dff[dff["FCL"].notna()]
-    
     # Obtener datos actualizados del FCL específico
-    fcl_details = dff[dff['FCL'] == fcl_number]
+    dff, fcl_index = get_despachos_limpios()
+    fcl_details = fcl_index.rows(fcl_number)
     if not fcl_details.empty:
         row = fcl_details.iloc[0]  # Usar los datos más actualizados
     
@@ -959,20 +966,26 @@ def show_despacho_detail_view():
     # Sección de imágenes (mantenida para futura implementación)
 
     try:
-        img_df = get_img_despacho_data(fcl_number)
-        if img_df is None:
-            img_df = pd.DataFrame(columns=['FCL', 'image_base64'])
-        
-        img_df = img_df[img_df["image_base64"].notna()]
-        img_df = img_df["image_base64"].to_list()
+        img_df = get_despacho_images(fcl_number)
         
         st.markdown("### 📸 Imágenes")
-        with st.expander("Imágenes del Despacho"):
+        gallery_key = f"despacho_{fcl_number}"
+        with st.expander("Imágenes del Despacho", expanded=f"{gallery_key}_imagen_ampliada" in st.session_state):
+            if st.button("🔄 Recargar imágenes", key=f"{gallery_key}_recargar"):
+                invalidate_img_despacho_cache(fcl_number)
+                get_despacho_thumbnails.clear()
+                get_img_despacho_counts.clear()
+                st.rerun()
             if len(img_df) > 0:
-                col_img = st.columns(3)
-                for i, img_url in enumerate(img_df):
-                    with col_img[i % 3]:
-                        st.image(img_url, width=200)
+                # La grilla muestra miniaturas; la imagen completa se busca por su image_id
+                image_ids, thumbnails = get_despacho_thumbnails(fcl_number)
+                images_by_id = dict(zip(img_df["image_id"], img_df["imagen"]))
+                show_image_gallery(
+                    thumbnails,
+                    images_by_id.get,
+                    key=gallery_key,
+                    ids=image_ids,
+                )
             else:
                 st.info("📷 No hay imágenes disponibles para este despacho")
     except Exception as e:
@@ -980,6 +993,33 @@ def show_despacho_detail_view():
     #st.info("📷 Funcionalidad de imágenes en desarrollo")
 
 
+def get_despacho_images(fcl_number):
+    """Imágenes de un despacho: DataFrame con image_id e imagen (bytes)"""
+    img_df = get_img_despacho_data(fcl_number)
+    if img_df is None or img_df.empty:
+        return pd.DataFrame(columns=["image_id", "imagen"])
+    return img_df[img_df["imagen"].notna()][["image_id", "imagen"]]
+
+
+@st.cache_data(show_spinner="Generando miniaturas...", ttl=600, max_entries=64)
+def get_despacho_thumbnails(fcl_number):
+    """
+    Miniaturas JPEG de las imágenes de un despacho, generadas una vez por FCL
+
+    Returns:
+        (list, list): image_id de cada imagen y su miniatura, en el mismo orden
+    """
+    image_ids, thumbnails = [], []
+    for image_id, image in get_despacho_images(fcl_number).itertuples(index=False):
+        image_ids.append(image_id)
+        try:
+            thumbnails.append(make_thumbnail(image))
+        except Exception as e:
+            print(f"⚠️ No se pudo generar la miniatura de {fcl_number}: {e}")
+            thumbnails.append(image)
+    return image_ids, thumbnails
+
+
 def go_back_to_despacho_list():
     """Función para volver a la lista principal de despachos"""
     if hasattr(st.session_state, 'current_view'):
@@ -8,145 +8,21 @@ import plotly.graph_objects as go
 from utils.get_api import listar_archivos_en_carpeta_compartida, get_download_url_by_name
 from utils.get_token import get_access_token, get_access_token_alza
 from utils.pdf_generator import generate_fcl_pdf_report
-from utils.handler_db import get_img_evacalidad_data
+from utils.handler_db import iter_img_evacalidad, get_img_evacalidad_image
+from utils.image_store import make_thumbnail
 from st_aggrid import AgGrid, GridOptionsBuilder, GridUpdateMode ,JsCode
 import base64
 import zipfile
 import io
 import json
-def categorize_presentation(presentation):
-        if pd.isna(presentation):
-            return "NO_ESPECIFICADO"
-        presentation_upper = str(presentation).upper()
-        
-        if "4.4" in presentation_upper:
-            return "4.4 OZ"
-        
-        elif "3.3" in presentation_upper:
-            return "BANDEJA BLANCA 3.3KG"
-        elif "3KG" in presentation_upper:
-            return "BANDEJA BLANCA 3KG"
-        elif "8X18OZ" in presentation_upper:
-            return "8X18 OZ"
-        elif "9.8OZ" in presentation_upper:
-            return "9.8 OZ PINTA PLANA"
-        elif "6OZ" in presentation_upper:
-            return "6 OZ"
-        elif "12X18" in presentation_upper:
-            return "12X18 OZ"
-        #elif "BANDEJA" in presentation_upper:
-        #    return "BANDEJA"
-        else:
-            return presentation_upper
-
-@st.cache_data(show_spinner="Cargando datos...", ttl=300)
-def get_data():
-    """Cargar datos principales con cache optimizado"""
-    access_token = get_access_token()
-    DATAS = listar_archivos_en_carpeta_compartida(access_token, "b!k0xKW2h1VkGnxasDN0z40PeA8yi0BwBKgEf_EOEPStmAWVEVjX8MQIydW1yMzk1b", "01SPKVU4I6RWNBBAVFIJF3GHBOYOFMUKZS")
-    data_ = get_download_url_by_name(DATAS, "BD EVALUACION DE CALIDAD DE PRODUCTO TERMINADO.xlsx")
-    df = pd.read_excel(data_, sheet_name="CALIDAD PRODUCTO TERMINADO")
-    return df
-
-
-@st.cache_data(show_spinner="Cargando images...",ttl=500)
-def get_images():
-    """Cargar solo metadatos de imágenes para optimizar rendimiento"""
-    access_token = get_access_token_alza()
-    DATAS = listar_archivos_en_carpeta_compartida(access_token, "b!M5ucw3aa_UqBAcqv3a6affR7vTZM2a5ApFygaKCcATxyLdOhkHDiRKl9EvzaYbuR", "01XOBWFSBLVGULAQNEKNG2WR7CPRACEN7Q")
-    data_ = get_download_url_by_name(DATAS, "imges_url_gd_calidad.parquet")
-    
-    df = pd.read_parquet(data_)
-    
-    df["folder_name"] = df["folder_name"].str.strip()
-    #df["folder_name"] = df["folder_name"].str.strip()
-    df = df.groupby(["folder_name"]).agg({
-        "image_download_url": lambda x: x.tolist(),
-        "image_thumbnail_url": lambda x: x.tolist(),
-    }).reset_index()
-    
-    
-    return df
-
+from views.components import show_image_gallery
+from utils.data_engine import clean_data as engine_clean_data, get_fcl_index, EMPRESA_MAPPING
 
+EMPRESA = "SAN LUCAR S.A."
 
 def clean_data():
-    """Procesar y limpiar datos con cache optimizado"""
-    df = get_data()
-    
-    # Convertir fechas una sola vez
-    df["FECHA DE MP"] = pd.to_datetime(df["FECHA DE MP"])
-    df["FECHA DE PROCESO"] = pd.to_datetime(df["FECHA DE PROCESO"])
-
-    # Fill NaN values with 0 for all float columns
-    float_columns = df.select_dtypes(include=['float64']).columns
-    df[float_columns] = df[float_columns].fillna(0)
-
-    # Limpiar datos de manera más eficiente
-    replacements = {
-        "MODULO ": {"`1": 1},
-        "TURNO ": {"Dia": 2, 111: 11},
-        "N° FCL": ['None', 'nan', 'NaN', 'NULL', 'null', ''],
-        "TRAZABILIDAD": ['None', 'nan', 'NaN', 'NULL', 'null', ''],
-        "OBSERVACIONES": ['None', 'nan', 'NaN', 'NULL', 'null', '']
-    }
-    
-    # Aplicar reemplazos de manera vectorizada
-    for col, values in replacements.items():
-        if col in df.columns:
-            if isinstance(values, dict):
-                df[col] = df[col].replace(values)
-            else:
-                df[col] = df[col].replace(values, "-")
-    
-    # Fill NaN values
-    df["TURNO "] = df["TURNO "].fillna(0)
-    df["VARIEDAD"] = df["VARIEDAD"].fillna("NO ESPECIFICADO")
-    df["PRESENTACION "] = df["PRESENTACION "].fillna("NO ESPECIFICADO")
-    df["DESTINO"] = df["DESTINO"].fillna("NO ESPECIFICADO")
-    df["TIPO DE CAJA"] = df["TIPO DE CAJA"].fillna("-")
-    df["TRAZABILIDAD"] = df["TRAZABILIDAD"].fillna("-")
-    
-    # Strip strings de manera vectorizada
-    string_columns = ["VARIEDAD", "PRESENTACION ", "DESTINO", "TIPO DE CAJA", "TRAZABILIDAD", "N° FCL"]
-    for col in string_columns:
-        if col in df.columns:
-            df[col] = df[col].astype(str).str.strip()
-            
-    # Mapeo de empresas
-    empresa_mapping = {
-        'GMH BERRIES S.A.C': 'AGRICOLA BLUE GOLD S.A.C.',
-        'BIG BERRIES S.A.C': 'AGRICOLA BLUE GOLD S.A.C.',
-        'CANYON BERRIES S.A.C': 'AGRICOLA BLUE GOLD S.A.C.',
-        'AGRICOLA BLUE GOLD S.A.C': 'AGRICOLA BLUE GOLD S.A.C.',
-        'EXCELLENCE FRUIT S.A.C': "SAN LUCAR S.A.",
-        'GAP BERRIES S.A.C': "SAN LUCAR S.A.",
-        'SAN EFISIO S.A.C': "SAN LUCAR S.A.",
-        'TARA FARMS S.A.C': "SAN LUCAR S.A.",
-    }
-    df["EMPRESA"] = df["PRODUCTOR"].replace(empresa_mapping)
-    
-    # Filtrar y limpiar - mejorar el filtrado para eliminar NaN
-    df = df[df["N° FCL"] != "-"]
-    df = df[df["N° FCL"] != "nan"]
-    df = df[df["N° FCL"] != "NaN"]
-    df = df[df["N° FCL"] != "None"]
-    df = df[df["N° FCL"].notna()]  # Eliminar valores NaN de pandas
-    df.columns = df.columns.str.strip()
-    
-    # Fill NaN en columnas numéricas
-    numeric_columns = df.select_dtypes(include=['float64', 'int64']).columns
-    df[numeric_columns] = df[numeric_columns].fillna(0)
-    
-    # Agregar información de imágenes (solo metadatos)
-    #img_df = get_images()
-
-    #df = df.merge(img_df, left_on="N° FCL", right_on="folder_name", how="left")
-    df = df[df["EMPRESA"] == "SAN LUCAR S.A."]
-    
-    return df
-
-
+    """Datos limpios del motor compartido, solo SAN LUCAR S.A."""
+    return engine_clean_data(empresa=EMPRESA, empresa_mapping=EMPRESA_MAPPING)
 
 
 
@@ -159,6 +35,7 @@ def show_finished_product():
         return
     
     df = clean_data()
+    fcl_index = get_fcl_index(empresa=EMPRESA, empresa_mapping=EMPRESA_MAPPING)
     
     
     
@@ -180,11 +57,6 @@ def show_finished_product():
         
     
 
-    df["PRESENTACION"] = df["PRESENTACION"].str.upper()
-    df["PRESENTACION"] = df["PRESENTACION"].str.replace(" ", "")
-    
-    df["PRESENTACION"] = df["PRESENTACION"].apply(categorize_presentation)
-    
     resumen_pag_df = df[['N° FCL','FECHA DE PROCESO','SEMANA','VARIEDAD','PRODUCTOR']]
     resumen_pag_df = resumen_pag_df.groupby(["N° FCL","SEMANA","VARIEDAD","PRODUCTOR"]).agg({"FECHA DE PROCESO": "max"}).reset_index()
     resumen_pag_df["SEMANA"] = resumen_pag_df["SEMANA"].astype(int)
@@ -204,7 +76,7 @@ def show_finished_product():
         for i, row2 in resumen_pag_df.iterrows():
             # Obtener el primer registro del FCL para mostrar información detallada
             fcl_number = row2['N° FCL']
-            fcl_detail_row = df[df['N° FCL'] == fcl_number].iloc[0]
+            fcl_detail_row = fcl_index.first(fcl_number)
             #fcl_detail_row = fcl_detail_row.groupby(["N° FCL","SEMANA","VARIEDAD","PRODUCTOR","PRESENTACION"]).agg({"FECHA DE PROCESO": "max"}).reset_index()
             
             # Crear tarjeta clickeable con modal
@@ -331,11 +203,6 @@ def show_fcl_detail_view():
     fcl_number = st.session_state.selected_fcl
     row = st.session_state.selected_fcl_data
     
-    # Cargar datos completos
-    df = clean_data()
-    df["PRESENTACION"] = df["PRESENTACION"].str.upper()
-    df["PRESENTACION"] = df["PRESENTACION"].str.replace(" ", "")
-    df["PRESENTACION"] = df["PRESENTACION"].apply(categorize_presentation)
     # Header con botón de regreso
     col1, col2 = st.columns([4, 1])
     
@@ -375,7 +242,7 @@ def show_fcl_detail_view():
         #st.write(f"**Acidez:** {row['ACIDEZ']:.2f}")
     
     # Obtener datos detallados del FCL específico
-    fcl_details = df[df['N° FCL'] == fcl_number]
+    fcl_details = get_fcl_index(empresa=EMPRESA, empresa_mapping=EMPRESA_MAPPING).rows(fcl_number)
     #fcl_details = fcl_details.reset_index()
     st.markdown("### 📋 Registros Detallados del FCL")
     
@@ -427,37 +294,19 @@ def show_fcl_detail_view():
     else:
         st.info("📋 No se han seleccionado filas específicas. Se generará el reporte con todas las filas.")
     try:
-        img_df = get_img_evacalidad_data(fcl_number)
-        if img_df is None:
-            img_df = pd.DataFrame(columns=['N° FCL','imagen'])
-    
-        #st.dataframe(img_df)
-    
-        
-        
-        img_df = img_df[img_df["imagen"].notna()]
-    
-        
-        img_df = img_df["imagen"].to_list()
-        
-        # Tabla de datos completos
-        
+        image_ids, thumbnails, legacy_ctids = get_fcl_thumbnails(fcl_number)
+        gallery_key = f"fcl_{fcl_number}"
         
         # Sección de imágenes
         st.markdown("### 📸 Imágenes")
-        with st.expander("Imágenes"):
-            if len(img_df) > 0:
-                
-                col_img = st.columns(3)
-                for i, img_url in enumerate(img_df):
-                    
-                    
-            
-                    with col_img[i % 3]:
-                        st.image(img_url,width=200)
-        
-                    
-                
+        with st.expander("Imágenes", expanded=f"{gallery_key}_imagen_ampliada" in st.session_state):
+            if len(thumbnails) > 0:
+                show_image_gallery(
+                    thumbnails,
+                    lambda image_id: get_img_evacalidad_image(fcl_number, image_id, legacy_ctids.get(image_id)),
+                    gallery_key,
+                    ids=image_ids,
+                )
             else:
                 st.info("📷 No hay imágenes disponibles para este FCL")
     except:
@@ -473,9 +322,9 @@ def show_fcl_detail_view():
     
     with col1:
         try:
-            generate_and_download_pdf(fcl_number, row, fcl_details,img_df)
-        except:
-            generate_and_download_pdf(fcl_number, row, fcl_details,[])
+            generate_and_download_pdf(fcl_number, row, fcl_details)
+        except Exception as e:
+            st.error(f"❌ Error al generar el reporte PDF: {e}")
     
     
     
@@ -484,7 +333,29 @@ def show_fcl_detail_view():
             go_back_to_list()
 
 
-def generate_and_download_pdf(fcl_number, fcl_data, detailed_records, img_df):
+@st.cache_data(show_spinner="Generando miniaturas...", ttl=600, max_entries=64)
+def get_fcl_thumbnails(fcl_number):
+    """
+    Miniaturas JPEG de un FCL; las imágenes se leen de a una desde la base de datos
+
+    Returns:
+        (list, list, dict): image_id de cada imagen y su miniatura, en el mismo
+            orden, y el ctid de la fila heredada de cada image_id sin migrar
+    """
+    image_ids, thumbnails, legacy_ctids = [], [], {}
+    for image_id, ctid, image in iter_img_evacalidad(fcl_number, with_ids=True):
+        image_ids.append(image_id)
+        if ctid is not None:
+            legacy_ctids[image_id] = ctid
+        try:
+            thumbnails.append(make_thumbnail(image))
+        except Exception as e:
+            print(f"⚠️ No se pudo generar la miniatura de {fcl_number}: {e}")
+            thumbnails.append(image)
+    return image_ids, thumbnails, legacy_ctids
+
+
+def generate_and_download_pdf(fcl_number, fcl_data, detailed_records):
     """Generate and provide download link for FCL PDF report"""
     
     # Obtener las filas seleccionadas del grid
@@ -558,18 +429,31 @@ def generate_and_download_pdf(fcl_number, fcl_data, detailed_records, img_df):
         'FECHA DE PROCESO': fcl_data['FECHA DE PROCESO'].strftime('%Y/%m/%d'),
     }
 
-    if not records_to_include.empty:
-        print(records_to_include.head(2))
-    
-    # Generate PDF with selected rows
-    pdf_buffer = generate_fcl_pdf_report(fcl_info, records_to_include.reset_index(drop=True), images_list=img_df)
+    # El PDF se genera al pedirlo: las imágenes se leen de a una desde la base de datos.
+    # Se guarda uno solo, junto con el FCL y las filas con que se generó; si la
+    # selección cambia deja de ofrecerse y se descarta
+    pdf_key = (fcl_number, int(pd.util.hash_pandas_object(records_to_include).sum()))
+    pdf_state = st.session_state.get("pdf_reporte")
+    if pdf_state is not None and pdf_state["key"] != pdf_key:
+        del st.session_state["pdf_reporte"]
+        pdf_state = None
+
+    if st.button("📄 Generar Reporte PDF", key=f"generate_pdf_{fcl_number}"):
+        # Un error de lectura a mitad de camino queda anotado en la sección de imágenes del PDF
+        images = iter_img_evacalidad(fcl_number)
+        pdf_buffer = generate_fcl_pdf_report(fcl_info, records_to_include.reset_index(drop=True), images_list=images)
+        pdf_state = {"key": pdf_key, "data": pdf_buffer.getvalue()}
+        st.session_state["pdf_reporte"] = pdf_state
+    
+    if pdf_state is None:
+        return
     
     # Create download button
     filename = f"Quality_Control_Report_{fcl_number}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
     
     st.download_button(
         label="📥 Descargar Reporte PDF",
-        data=pdf_buffer.getvalue(),
+        data=pdf_state["data"],
         file_name=filename,
         mime="application/pdf",
         key=f"download_pdf_{fcl_number}",
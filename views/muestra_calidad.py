@@ -6,134 +6,15 @@ from styles import styles_
 import plotly.express as px
 import plotly.graph_objects as go
 from utils.get_api import listar_archivos_en_carpeta_compartida, get_download_url_by_name
+from utils.snapshot_store import file_version
+from utils.workbook_reader import load_sheets
 from utils.get_token import get_access_token, get_access_token_alza
 from utils.pdf_generator import generate_fcl_pdf_report
-from utils.handler_db import get_img_evacalidad_data
+from utils.image_store import get_image_store
 from views.finished_product import *
+from utils.data_engine import clean_data, get_data, get_images, get_fcl_index, EMPRESA_MAPPING_MUESTRAS
 from st_aggrid import AgGrid, GridOptionsBuilder, GridUpdateMode ,JsCode
 
-def categorize_presentation(presentation):
-        if pd.isna(presentation):
-            return "NO_ESPECIFICADO"
-        presentation_upper = str(presentation).upper()
-        
-        if "4.4" in presentation_upper:
-            return "4.4 OZ"
-        
-        elif "3.3" in presentation_upper:
-            return "BANDEJA BLANCA 3.3KG"
-        elif "3KG" in presentation_upper:
-            return "BANDEJA BLANCA 3KG"
-        elif "8X18OZ" in presentation_upper:
-            return "8X18 OZ"
-        elif "9.8OZ" in presentation_upper:
-            return "9.8 OZ PINTA PLANA"
-        elif "6OZ" in presentation_upper:
-            return "6 OZ"
-        elif "12X18" in presentation_upper:
-            return "12X18 OZ"
-        #elif "BANDEJA" in presentation_upper:
-        #    return "BANDEJA"
-        else:
-            return presentation_upper
-
-@st.cache_data(show_spinner="Cargando datos...", ttl=300)
-def get_data():
-    """Cargar datos principales con cache optimizado"""
-    access_token = get_access_token()
-    DATAS = listar_archivos_en_carpeta_compartida(access_token, "b!k0xKW2h1VkGnxasDN0z40PeA8yi0BwBKgEf_EOEPStmAWVEVjX8MQIydW1yMzk1b", "01SPKVU4I6RWNBBAVFIJF3GHBOYOFMUKZS")
-    data_ = get_download_url_by_name(DATAS, "BD EVALUACION DE CALIDAD DE PRODUCTO TERMINADO.xlsx")
-    df = pd.read_excel(data_, sheet_name="CALIDAD PRODUCTO TERMINADO")
-    return df
-
-
-@st.cache_data(show_spinner="Cargando images...",ttl=500)
-def get_images():
-    """Cargar solo metadatos de imágenes para optimizar rendimiento"""
-    access_token = get_access_token_alza()
-    DATAS = listar_archivos_en_carpeta_compartida(access_token, "b!M5ucw3aa_UqBAcqv3a6affR7vTZM2a5ApFygaKCcATxyLdOhkHDiRKl9EvzaYbuR", "01XOBWFSBLVGULAQNEKNG2WR7CPRACEN7Q")
-    data_ = get_download_url_by_name(DATAS, "imges_url_gd_calidad.parquet")
-    df = pd.read_parquet(data_)
-    df["folder_name"] = df["folder_name"].str.strip()
-    df = df.groupby(["folder_name"]).agg({
-        "image_download_url": lambda x: x.tolist(),
-        "image_thumbnail_url": lambda x: x.tolist(),
-    }).reset_index()
-    return df
-
-def clean_data():
-    """Procesar y limpiar datos con cache optimizado"""
-    df = get_data()
-    
-    # Convertir fechas una sola vez
-    df["FECHA DE MP"] = pd.to_datetime(df["FECHA DE MP"])
-    df["FECHA DE PROCESO"] = pd.to_datetime(df["FECHA DE PROCESO"])
-
-    # Fill NaN values with 0 for all float columns
-    float_columns = df.select_dtypes(include=['float64']).columns
-    df[float_columns] = df[float_columns].fillna(0)
-
-    # Limpiar datos de manera más eficiente
-    replacements = {
-        "MODULO ": {"`1": 1},
-        "TURNO ": {"Dia": 2, 111: 11},
-        "N° FCL": ['None', 'nan', 'NaN', 'NULL', 'null', ''],
-        "TRAZABILIDAD": ['None', 'nan', 'NaN', 'NULL', 'null', ''],
-        "OBSERVACIONES": ['None', 'nan', 'NaN', 'NULL', 'null', '']
-    }
-    
-    # Aplicar reemplazos de manera vectorizada
-    for col, values in replacements.items():
-        if col in df.columns:
-            if isinstance(values, dict):
-                df[col] = df[col].replace(values)
-            else:
-                df[col] = df[col].replace(values, "-")
-    
-    # Fill NaN values
-    df["TURNO "] = df["TURNO "].fillna(0)
-    df["VARIEDAD"] = df["VARIEDAD"].fillna("NO ESPECIFICADO")
-    df["PRESENTACION "] = df["PRESENTACION "].fillna("NO ESPECIFICADO")
-    df["DESTINO"] = df["DESTINO"].fillna("NO ESPECIFICADO")
-    df["TIPO DE CAJA"] = df["TIPO DE CAJA"].fillna("-")
-    df["TRAZABILIDAD"] = df["TRAZABILIDAD"].fillna("-")
-    
-    # Strip strings de manera vectorizada
-    string_columns = ["VARIEDAD", "PRESENTACION ", "DESTINO", "TIPO DE CAJA", "TRAZABILIDAD", "N° FCL"]
-    for col in string_columns:
-        if col in df.columns:
-            df[col] = df[col].astype(str).str.strip()
-
-    empresa_mapping = {
-        'GMH BERRIES S.A.C': 'AGRICOLA BLUE GOLD S.A.C.',
-        'BIG BERRIES S.A.C': 'AGRICOLA BLUE GOLD S.A.C.',
-        'CANYON BERRIES S.A.C': 'AGRICOLA BLUE GOLD S.A.C.',
-        'AGRICOLA BLUE GOLD S.A.C': 'AGRICOLA BLUE GOLD S.A.C.',
-        'EXCELLENCE FRUIT S.A.C': "SAN LUCAR S.A.",
-        'GAP BERRIES S.A.C': "SAN LUCAR S.A.",
-        'SAN EFISIO S.A.C': "SAN LUCAR S.A.",
-        'TARA FARMS S.A.C': "SAN LUCAR S.A.",
-        #'TARA FARMS S.A.C': "SAN LUCAR S.A.",
-        'QBERRIES S.A.C': "SAN LUCAR S.A.",
-    }
-    df["EMPRESA"] = df["PRODUCTOR"].replace(empresa_mapping)
-    df = df[df["N° FCL"] != "-"]
-    df = df[df["N° FCL"] != "nan"]
-    df = df[df["N° FCL"] != "NaN"]
-    df = df[df["N° FCL"] != "None"]
-    df = df[df["N° FCL"].notna()]  # Eliminar valores NaN de pandas
-    df.columns = df.columns.str.strip()
-    
-    numeric_columns = df.select_dtypes(include=['float64', 'int64']).columns
-    df[numeric_columns] = df[numeric_columns].fillna(0)
-
-    #df = df[df["EMPRESA"] == "SAN LUCAR S.A."]
-    df = df.sort_values(by="FECHA DE PROCESO", ascending=False)
-    df["PRESENTACION"] = df["PRESENTACION"].str.upper()
-    df["PRESENTACION"] = df["PRESENTACION"].str.replace(" ", "")
-    df["PRESENTACION"] = df["PRESENTACION"].apply(categorize_presentation)
-    return df
-
 def muestras_calidad():
     styles_(1)
     #st.markdown('<h1 class="main-header">🫐 Evaluación de Producto Terminado</h1>', unsafe_allow_html=True)
@@ -141,15 +22,15 @@ def muestras_calidad():
     with col_head_1:
         st.title("🫐 Evaluación de Producto Terminado",)
 
-    df = clean_data()
+    fcl_index = get_fcl_index(empresa_mapping=EMPRESA_MAPPING_MUESTRAS)
 
     with col_head_2:
-        search_term = st.selectbox("Buscar FCL", sorted(df["N° FCL"].unique()),index=None,placeholder="Seleccione N° FCL")
+        search_term = st.selectbox("Buscar FCL", fcl_index.fcls,index=None,placeholder="Seleccione N° FCL")
     #st.title("Evaluación de Producto Terminado")
     
     
     if search_term != None :
-        df = df[df["N° FCL"]==search_term]
+        df = fcl_index.rows(search_term)
         #st.dataframe(df)
         row = df.copy()
         #st.markdown(f'<h1 class="main-header">📋 Detalle del FCL: {search_term}</h1>', unsafe_allow_html=True)
@@ -206,29 +87,23 @@ def muestras_calidad():
             )
          
         try:
-            img_df = pd.read_parquet("./img/bd_img.parquet")
-            img_df = img_df[img_df["folder_name"] == search_term]
-            #img_df = get_img_evacalidad_data(search_term)
-            
+            # Solo se leen el índice y los blobs de este FCL
+            image_store = get_image_store()
+            img_df = image_store.get_image_paths(search_term)
+
             #if img_df is None:
             #    img_df = pd.DataFrame(columns=['N° FCL','imagen'])
-            img_df = img_df[img_df["image_base64"].notna()]
-            img_df = img_df["image_base64"].to_list()
 
             st.markdown("### 📸 Imágenes")
-            with st.expander("Imágenes"):
+            gallery_key = f"muestras_{search_term}"
+            with st.expander("Imágenes", expanded=f"{gallery_key}_imagen_ampliada" in st.session_state):
                 if len(img_df) > 0:
-                    
-                    col_img = st.columns(3)
-                    for i, img_url in enumerate(img_df):
-                        
-                        
-                
-                        with col_img[i % 3]:
-                            st.image(img_url,width=200)
-            
-                        
-                    
+                    # La grilla muestra miniaturas; la imagen completa se carga al pedirla
+                    show_image_gallery(
+                        image_store.get_thumbnail_paths(search_term),
+                        lambda i: img_df[i],
+                        key=gallery_key,
+                    )
                 else:
                     st.info("📷 No hay imágenes disponibles para este FCL")
         except:
@@ -247,6 +122,19 @@ def muestras_calidad():
     else:
         st.warning("Por favor, seleccione al menos un FCL para buscar.")
 
+CONTRAMUESTRAS_PATH = "Resultados de CONTRAMUESTRAS - SAN LUCAR 2025.xlsx"
+
+CONTRAMUESTRAS_SHEETS = {
+    "calidad": {"sheet_name": "CALIDAD + CONDICIÓN"},
+    "firmeza": {"sheet_name": "FIRMEZA, COLOR DE PULPA", "skiprows": 1},
+    "pesos": {"sheet_name": "PESOS", "skiprows": 2},
+}
+
+@st.cache_data(show_spinner="Cargando contramuestras...", max_entries=1)
+def get_contramuestras_sheets(version):
+    """Hojas de contramuestras leídas en una sola pasada, cacheadas por versión del archivo"""
+    return load_sheets("contramuestras", version, CONTRAMUESTRAS_PATH, CONTRAMUESTRAS_SHEETS)
+
 ##Resultados de CONTRAMUESTRAS - SAN LUCAR 2025
 def contramuestras_calidad():
     styles_(1)
@@ -254,7 +142,8 @@ def contramuestras_calidad():
     col_head_1,col_head_2 = st.columns([3,1])
     with col_head_1:
         st.title("🫐 Contramuestras")
-    df = pd.read_excel("Resultados de CONTRAMUESTRAS - SAN LUCAR 2025.xlsx",sheet_name="CALIDAD + CONDICIÓN")
+    sheets = get_contramuestras_sheets(file_version(CONTRAMUESTRAS_PATH))
+    df = sheets["calidad"]
     with col_head_2:
         st.markdown("**🔍 Búsqueda por N° FCL**")
         input_fcl = st.selectbox("Ingrese el N° FCL:", df[df['N° FCL'].notna()]['N° FCL'].unique(),index=None)
@@ -332,7 +221,7 @@ def contramuestras_calidad():
     
     #print(df.info())
     #st.dataframe(df)
-    firmeza_df = pd.read_excel("Resultados de CONTRAMUESTRAS - SAN LUCAR 2025.xlsx",sheet_name="FIRMEZA, COLOR DE PULPA",skiprows=1)
+    firmeza_df = sheets["firmeza"]
     if input_fcl is not None:
         firmeza_df = firmeza_df[firmeza_df['N° FCL']==input_fcl]
     cols_firmeza =['N° FCL', #'N° CONTENEDOR',#, 'N° DE CONTRAMUESTRA', 'DÍAS EVALUADOS',
@@ -377,7 +266,7 @@ def contramuestras_calidad():
         firmeza_df[col] = firmeza_df[col].astype(float)
     firmeza_df = firmeza_df.reset_index(drop=True)
     #st.dataframe(firmeza_df)
-    pesos_df = pd.read_excel("Resultados de CONTRAMUESTRAS - SAN LUCAR 2025.xlsx",sheet_name="PESOS",skiprows=2)
+    pesos_df = sheets["pesos"]
     cols_pesos=['N° FCL', 'N° CONTENEDOR', 'N° DE CONTRAMUESTRA', 'DÍAS EVALUADOS',
        'MERCADO', 'PRESENTACIÓN', 'FECHA DE PRODUCIÓN', 'PROVEEDOR',
        'VARIEDAD', 'PESO 1\n(gramos)\n>=135',
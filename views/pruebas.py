@@ -25,8 +25,8 @@ def show_pruebas():
     input_fcl = st.text_input("Ingrese el número de FCL")
     img_df = get_img_despacho_data(input_fcl)
     st.dataframe(img_df)
-    img_df = img_df[img_df["image_base64"].notna()]
-    img_df = img_df["image_base64"].to_list()
+    img_df = img_df[img_df["imagen"].notna()]
+    img_df = img_df["imagen"].to_list()
     if len(img_df) > 0:
         col_img = st.columns(3)
         for i, img_url in enumerate(img_df):
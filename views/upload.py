@@ -9,9 +9,9 @@ import plotly.graph_objects as go
 from utils.get_api import listar_archivos_en_carpeta_compartida, get_download_url_by_name
 from utils.get_token import get_access_token, get_access_token_alza
 from utils.pdf_generator import generate_fcl_pdf_report
-from utils.handler_db import get_img_evacalidad_data
 from views.finished_product import *
-from utils.get_sheets import list_folders,authenticate_google_drive,list_images_in_folder,download_image,image_to_base64
+from utils.get_sheets import list_folders,authenticate_google_drive
+from utils.image_ingest import collect_pending, ingest_images
 
 
 def share_img():
@@ -28,106 +28,15 @@ def share_img():
     if btn:
         service = authenticate_google_drive()
         folders = list_folders(service, "1OqY3VnNgsbnKRuqVZqFi6QSXqKDC4uox", fcl_input)
-        all_data = []
+        pending = collect_pending(service, folders)
 
-        for i, folder in enumerate(folders, 1):
-            print(f"\n📂 Procesando carpeta {i}/{len(folders)}: {folder['name']}")
-            
-            # Obtener imágenes en la carpeta
-            images = list_images_in_folder(service, folder['id'])
-            
-            if not images:
-                print(f"   ⚠️  No se encontraron imágenes en '{folder['name']}'")
-                # Agregar carpeta sin imágenes como una fila
-                all_data.append({
-                    'folder_id': folder['id'],
-                    'folder_name': folder['name'],
-                    'folder_webViewLink': folder['webViewLink'],
-                    'folder_modifiedTime': folder.get('modifiedTime'),
-                    'image_id': None,
-                    'image_name': None,
-                    'image_webViewLink': None,
-                    'image_modifiedTime': None,
-                    'image_base64': None,
-                    'image_size_mb': 0
-                })
-                continue
-            
-            print(f"   ✅ Se encontraron {len(images)} imágenes")
-            
-            # Procesar cada imagen como una fila separada
-            for j, image in enumerate(images, 1):
-                original_size_mb = int(image.get('size', 0)) / (1024 * 1024)
-                print(f"      🖼️  Procesando imagen {j}/{len(images)}: {image['name']} ({original_size_mb:.2f}MB)")
-                
-                # Descargar imagen
-                image_data = download_image(service, image['id'])
-                if not image_data:
-                    print(f"         ❌ Error al descargar {image['name']}")
-                    # Agregar fila con error
-                    all_data.append({
-                        'folder_id': folder['id'],
-                        'folder_name': folder['name'],
-                        'folder_webViewLink': folder['webViewLink'],
-                        'folder_modifiedTime': folder.get('modifiedTime'),
-                        'image_id': image['id'],
-                        'image_name': image['name'],
-                        'image_webViewLink': image.get('webViewLink'),
-                        'image_modifiedTime': image.get('modifiedTime'),
-                        'image_base64': None,
-                        'image_size_mb': original_size_mb
-                    })
-                    continue
-                
-                # Convertir a base64
-                base64_image = image_to_base64(image_data)
-                if base64_image:
-                    # Calcular tamaño optimizado
-                    optimized_size_mb = len(base64_image) * 0.75 / (1024 * 1024)
-                    reduction_percent = (1 - optimized_size_mb / original_size_mb) * 100 if original_size_mb > 0 else 0
-                    
-                    # Agregar fila con imagen procesada
-                    all_data.append({
-                        'folder_id': folder['id'],
-                        'folder_name': folder['name'],
-                        'folder_webViewLink': folder['webViewLink'],
-                        'folder_modifiedTime': folder.get('modifiedTime'),
-                        'image_id': image['id'],
-                        'image_name': image['name'],
-                        'image_webViewLink': image.get('webViewLink'),
-                        'image_modifiedTime': image.get('modifiedTime'),
-                        'image_base64': base64_image,
-                        'image_size_mb': optimized_size_mb
-                    })
-                else:
-                    
-                    # Agregar fila con error
-                    all_data.append({
-                        'folder_id': folder['id'],
-                        'folder_name': folder['name'],
-                        'folder_webViewLink': folder['webViewLink'],
-                        'folder_modifiedTime': folder.get('modifiedTime'),
-                        'image_id': image['id'],
-                        'image_name': image['name'],
-                        'image_webViewLink': image.get('webViewLink'),
-                        'image_modifiedTime': image.get('modifiedTime'),
-                        'image_base64': None,
-                        'image_size_mb': original_size_mb
-                    })
-        dff = pd.DataFrame(all_data)
-        #st.dataframe(dff)
-        #print(dff.columns)
-        if not os.path.exists("./img/bd_img.parquet"):
-            bd_img = pd.DataFrame(columns=['folder_id', 'folder_name', 'folder_webViewLink', 'folder_modifiedTime',
-        'image_id', 'image_name', 'image_webViewLink', 'image_modifiedTime',
-        'image_base64', 'image_size_mb'])
-        else:
-            bd_img = pd.read_parquet("./img/bd_img.parquet")
-        #    os.makedirs("./img")
-        bd_img = pd.concat([bd_img, dff], ignore_index=True)
-        bd_img = bd_img.drop_duplicates()
-        bd_img.to_parquet("./img/bd_img.parquet", index=False)
-        st.write(bd_img.shape)
-        st.dataframe(bd_img)
-        st.success(f"✅ Imágenes procesadas y guardadas en Parquet")
-            
+        progress = st.progress(0.0, text=f"Descargando {len(pending)} imágenes...")
+
+        def on_progress(done, total, image):
+            progress.progress(done / total, text=f"Procesando imagen {done}/{total}: {image['name']}")
+
+        dff = ingest_images(pending, on_progress=on_progress)
+        progress.empty()
+        st.write(dff.shape)
+        st.dataframe(dff)
+        st.success(f"✅ {len(dff)} imágenes nuevas o actualizadas guardadas en el almacén de imágenes")